@@ -13,6 +13,7 @@ import webview
 import subprocess
 import io
 import base64
+import uuid
 from PIL import Image
 from PyQt6 import QtGui, QtWidgets
 from PyQt6.QtCore import Qt
@@ -21,36 +22,37 @@ from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineCertificateError
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-from threading import Thread
 from pathlib import Path
 
 ########################################################################################
 """############################    Services imports    ##############################"""
 ########################################################################################
 # System config
-from services.config import HasAttachment, BASE_PATH, ALLOWED_KEYS, SECRET_KEY, get_local_ip, ChatContext, ChatState, \
-    init_qwen_vl, FileSupport, init_qwen
+from services.config import HasAttachment, BASE_PATH, ALLOWED_KEYS, SECRET_KEY, get_local_ip, \
+    init_qwen_vl, FileSupport, init_qwen, init_qwen_utility, init_embed
+import services.config as config
 from services.mkcert import check_mkcert
 # DB
 from services.db_access import init_db
 from services.db_persist import save_settings, save_nutrition_user_values, persist_nutri_item, persist_nutrition_intake, update_today_consumed_items
 from services.db_get import get_settings, GetDB, food_search
+from services.prompts_system import SystemPrompts
 # Cast to text
 from services.url_to_txt import save_url_text
 from services.file_to_txt import file_to_txt
 from services.stt_vosk import get_vosk_model, transcribe_audio
-# Intent
-from services.llm_intent import ask_intent, ask_wikipedia, ask_web
-# VL
-from services.llm_vl import image_inference
-# Chat
-from services.llm_chat import ChatSession, ask_weather
-from services.tts import init_tts, voice_out, split_into_chunks, clean_voice_chunks
-# Command
-from services.command_library import command_lookup
+# Message pipeline (hardcode, intent, actions, chat)
+from services.pipeline import MessagePipeline
+from services.chat_sessions import ChatRegistry
+from services.intent_recall import IntentRecall
+from services.intent_embed import IntentEmbedIndex
+from services.tts import init_tts, TTSWorker, split_into_chunks, clean_voice_chunks
+# Inference scheduling
+from services import llm_scheduler, tracing, tts
 #from services.browser.chromium import chromium_print
 from services.media import discover_playlists
 from services.smart_plugs import load_plugs_from_db
+from services.weather import WeatherCache
 # Barcode/Nutrition
 from services.llm_vl import scan_barcode
 from services.api_openfoodfacts import lookup_barcode
@@ -99,8 +101,9 @@ def load_settings():
 def persist_settings():
     data = request.get_json()
     save_settings(data)
-    # refresh plugs
+    # refresh plugs and the prompts built from settings
     load_plugs_from_db()
+    SystemPrompts.invalidate()
     print("[Settings modal] Saved.")
     return jsonify({"status": "ok"})
 
@@ -269,193 +272,79 @@ def save_todo_list():
 ########################################################################################
 """############################      Chat+Intent       ##############################"""
 ########################################################################################
-"""
-Data structure: {"intent": "chat", "command": "Pass to Mira.", "matched": user_msg}
-    - Intent can be action/chat. 
-    - Commands are in services/command_library.py and the intent prompt in services/prompts_system.py
-    - user_msg is split by the LLM (intent route) and set as user_msg field in each of n json objects
-        - That means we can resolve chat cleanly without confusing it with commands
-        - new data structure: {complete object}\n{complete object}\n...
-        
-ChatState is global, so the piping is simpler = 
-    - tunnel into all three (hardcode, intent, chat) for each complete object.
-    - dont have to constantly convert data when passing from front- to backend.
-"""
-@mira.route("/hardcode", methods=["POST"])
-def hardcode():
-    data = request.get_json(silent=True) or {}
-    user_msg = data.get("message", "").strip()
-    ChatState.user_msg = user_msg
-
-    if "wikipedia" in user_msg:
-        ask_wikipedia(user_msg)
-        ChatState.intent = {"intent": "chat", "command": "Pass to Mira.", "matched": user_msg}
-        HasAttachment.set_attachment(True)
-        print("[Hardcode] Detected wikipedia")
-        return jsonify({"reply": "Hardcode detected: wikipedia"})
-
-    elif "web" in user_msg and "search" in user_msg:
-        ask_web(user_msg)
-        ChatState.intent = {"intent": "chat", "command": "Pass to Mira.", "matched": user_msg}
-        HasAttachment.set_attachment(True)
-        print("[Hardcode] Detected web search")
-        return jsonify({"reply": "Hardcode detected: web search"})
-
-    else:
-        # no hardcode detected
-        ChatState.intent = None
-        return jsonify({"reply": "No hardcode detected"}) # frontend dives into /intent
-
-@mira.route("/intent", methods=["POST"])
-def intent():
-    user_msg = ChatState.user_msg or ""
-    # Bypass if hardcode already set intent to chat
-    if ChatState.intent and isinstance(ChatState.intent, dict) and ChatState.intent.get("intent") == "chat":
-        print("[Intent] Detected chat, bypassing.")
-        return jsonify({"reply": "Bypass intent"})
-
-    try:
-        raw_intent = ask_intent(user_msg)  # returns JSONL string: {complete object}\n{complete object}\n...
-        intents = []
-        commands = []
-
-        # separate properly
-        for line in raw_intent.strip().splitlines():
-            if not line.strip():
-                continue
-            obj = json.loads(line)
-
-            # If obj is a list, iterate through its items
-            # TODO: Figure out why we need this duplication and unify
-            if isinstance(obj, list):
-                for item in obj:
-                    intents.append(item)
-                    intent_type = item.get("intent", "")
-                    command = item.get("command", "")
-                    if intent_type == "action":
-                        if command == "get weather":
-                            ChatState.weather = ask_weather(user_msg)
-                            print(f"[Intent] Determined weather: {ChatState.weather}")
-                            # mark as bypass so frontend continues into /chat
-                            return jsonify({"reply": "Bypass intent"})
-                        else:
-                            if command_lookup(command, user_msg): commands.append(command)
-                            else: print(f"[Intent] Ignored invalid command: {command}")
-                    elif intent_type == "chat":
-                        ChatState.intent = item
-            # If obj is a dict, iterate through its items
-            elif isinstance(obj, dict):
-                intents.append(obj)
-                intent_type = obj.get("intent", "")
-                command = obj.get("command", "")
-                if intent_type == "action":
-                    if command == "get weather":
-                        ChatState.weather = ask_weather(user_msg)
-                        print(f"[Intent] Determined weather: {ChatState.weather}")
-                        # mark as bypass so frontend continues into /chat
-                        return jsonify({"reply": "Bypass intent"})
-                    else:
-                        if command_lookup(command, user_msg): commands.append(command)
-                        else: print(f"[Intent] Ignored invalid command: {command}")
-                elif intent_type == "chat":
-                    ChatState.intent = obj
-
-        # Decide what to return based on intent composition
-        if commands and any(i.get("intent") == "chat" for i in intents if isinstance(i, dict)):
-            # Mixed case: both action and chat
-            chat_intent = next(
-                (i for i in intents if isinstance(i, dict) and i.get("intent") == "chat"),
-                None
-            )
-            if chat_intent:
-                ChatState.intent = chat_intent
-            print(f"[Intent] Determined actions: {commands} and chat")
-            return jsonify({"reply": f"Handled action: {', '.join(commands)}; Chat"})
-
-        elif commands:
-            # only actions
-            ChatState.intent = intents
-            print(f"[Intent] Determined actions: {commands}")
-            return jsonify({"reply": f"Handled action: {', '.join(commands)}"})
-        else:
-            # only chat
-            print("[Intent] Determined chat intent, passing to /chat")
-            return jsonify({"reply": "Bypass intent"})
-
-    except json.JSONDecodeError:
-        return jsonify({"reply": "Invalid intent response: not a valid JSON"})
-    except Exception as e:
-        return jsonify({"reply": f"Error parsing intent: {str(e)}"})
-
-# Chat route
-@mira.route("/chat", methods=["POST"])
-def chat():
-    # Unique case (voice out but not chat)
-    # So weather context doesn't taint the chat session
-    if ChatState.weather:
-        response = ChatState.weather
-        ChatState.weather = None  # reset
-        return jsonify({"reply": response})
-
-    # Default to the raw user message
-    user_msg = ChatState.user_msg or ""
-    intent = ChatState.intent
-
-    if isinstance(intent, dict) and intent.get("intent") == "chat":
-        # Prefer the matched field if present
-        matched_text = intent.get("matched")
-        if matched_text:
-            user_msg = matched_text
-
-        try:
-            # Channel to VL if an image is attached
-            # Small and probably even big VL models suck at longer text context
-            if HasAttachment.has_attachment() and HasAttachment.is_picture():
-                img_path = BASE_PATH / "temp" / "picture.jpeg"
-                print(f"[VL] Reading attachment...")
-                assistant_reply = image_inference(img_path, user_msg)
-                HasAttachment.clear() # both is picture and attachment
-                socketio.emit('attachment_update', {
-                    "has_attachment": False,
-                    "type": "consumed"
-                })
-                return jsonify({"reply": assistant_reply})
-
-            # Channel to txt model if we've converted an allowed input into .txt
-            elif HasAttachment.has_attachment():
-                txt_path = BASE_PATH / "temp" / "output.txt"
-                try:
-                    context = txt_path.read_text(encoding="utf-8")
-                    combined_input = context + "\n\n" + user_msg
-                except Exception as e:
-                    print(f"[Chat] Failed to read attachment: {e}")
-                    combined_input = user_msg
-                socketio.emit('attachment_update', {
-                    "has_attachment": False,
-                    "type": "consumed"
-                })
-                HasAttachment.set_attachment(False)
-            else:
-                # Is just regular chat without attachment = continue
-                combined_input = user_msg
-
-            # Pass to txt LLM
-            assistant_reply = ChatContext.chat_session.ask(combined_input)
-
-        except Exception as e:
-            print(f"[Chat] Error: {e}")
-            assistant_reply = "Error processing message."
-
-        return jsonify({"reply": assistant_reply})
+# One event per user message; partial results are pushed back to the asking client (services/pipeline.py)
+@socketio.on('user_message')
+def handle_user_message(data):
+    if not session.get('authenticated'):
+        emit('pipeline_done', {"error": "Unauthorized"})
+        return
+    user_msg = (data or {}).get("message", "").strip()
+    if not user_msg:
+        emit('pipeline_done', {})
+        return
+    # set by check_access on the page load; the socket's session copy is never written back to the cookie
+    chat_id = session.get('chat_id')
+    if not chat_id:
+        emit('pipeline_done', {"error": "No chat session, please reload the page."})
+        return
+    sid = request.sid
+    # barge-in: a new message silences the previous reply of this chat
+    TTSWorker.cancel_owner(chat_id)
+
+    def emit_to_client(event, payload):
+        socketio.emit(event, payload, to=sid)
+
+    # request_id: the /upload_audio trace of a spoken message, so STT and the pipeline share one id
+    pipeline = MessagePipeline(user_msg, chat_id, emit_to_client, socketio.emit, data.get("request_id"))
+    socketio.start_background_task(pipeline.run)
+
+# recording started (or the user stopped playback): drop the speech still being synthesized for this chat
+@socketio.on('voice_stop')
+def handle_voice_stop():
+    if not session.get('authenticated') or not session.get('chat_id'):
+        return
+    TTSWorker.cancel_owner(session['chat_id'])
+
+# inference queue depth and prompt cache usage
+@mira.route("/api/llm/status", methods=["GET"])
+def llm_status():
+    cache = config.llm.cache if config.llm is not None else None
+    utility_cache = config.llm_utility.cache if config.llm_utility is not None else None
+    return jsonify({
+        "scheduler": llm_scheduler.stats(),
+        "routes": {task: config.route_model(task) for task in config.LLM_ROUTES},
+        "prompt_cache": cache.stats() if cache is not None else None,
+        "utility_prompt_cache": utility_cache.stats() if utility_cache is not None else None,
+        "chat_sessions": ChatRegistry.stats(),
+        "intent_recall": IntentRecall.stats(),
+        "tts_worker": TTSWorker.stats(),
+        "tts_cache": tts.tts_cache.stats() if tts.tts_cache is not None else None,
+    })
 
-    else:
-        # Action intents already handled in /intent
-        # Front end doesn't analyze. It just tunnels into all three routes, so we need this last else.
-        return jsonify({"reply": ""})
+# XTTS voices: the speaker WAVs in static/xtts-v2/samples, switchable at runtime (services/tts.py)
+@mira.route("/api/tts/voices", methods=["GET"])
+def tts_voices():
+    return jsonify({"voices": tts.list_voices()})
+
+@mira.route("/api/tts/voice", methods=["POST"])
+def tts_voice():
+    name = (request.json or {}).get("voice", "")
+    if not tts.set_voice(name):
+        return jsonify({"error": f"Unknown voice: {name}"}), 404
+    return jsonify({"voice": name})
+
+# recent request traces and p50/p95 per stage (services/tracing.py)
+@mira.route("/api/traces", methods=["GET"])
+def traces():
+    limit = request.args.get("limit", default=50, type=int)
+    return jsonify({
+        "stages": tracing.Traces.stats(),
+        "traces": tracing.Traces.recent(limit, request.args.get("kind")),
+    })
 
 @mira.route("/new_chat", methods=["POST"])
 def new_chat():
-    ChatContext.chat_session = ChatSession()
+    ChatRegistry.reset(current_chat_id())
     HasAttachment.set_attachment(False)
     print("[Chat] Started new chat session")
     return jsonify({"status": "new session started"})
@@ -463,8 +352,8 @@ def new_chat():
 ########################################################################################
 """############################         Voice          ##############################"""
 ########################################################################################
-# TODO: Should migrate to using socket.io.js to notify the front end of a chunk to play.
-#   - Frontend needs to have a playback bucket that it plays until empty (chunk generation is faster than voice playback).
+# Chat replies are voiced by the message pipeline and streamed over Socket.IO (voice_segment, services/pipeline.py).
+# These routes remain for file based synthesis: clients that poll static/temp/output_<i>_<timestamp>.wav.
 
 # determine voice chunk amount
 # Reasons to chunk: 1) Latency (how quickly the app can respond) 2) model restrictions
@@ -488,8 +377,8 @@ def synth():
     timestamp = data.get("timestamp") # ("%Y%m%d%H%M%S%f")
 
     try:
-        # Use threading to start synthesis
-        Thread(target=voice_out, args=(text, timestamp)).start()
+        # queued on the TTS worker, one synthesis at a time
+        TTSWorker.submit(text, timestamp, owner=current_chat_id())
         return jsonify({"status": "synthesis started", "timestamp": timestamp})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -503,20 +392,26 @@ def upload_audio():
     wav_path = BASE_PATH / "static" / "temp" / "input.wav"
 
     audio.save(webm_path)
-    # Convert to WAV for Vosk (mono, 16kHz, 16-bit PCM)
+    trace = tracing.start("stt")
     try:
-        subprocess.run([
-            "ffmpeg", "-y", "-i", str(webm_path),
-            "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", str(wav_path)
-        ], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"[FFmpeg] WAV conversion failed: {e}")
-        return jsonify({"error": "Audio conversion failed"}), 500
-
-    # Transcribe the WAV using Vosk
-    result = transcribe_audio(wav_path)
-
-    return jsonify({ "transcript": result["text"] })
+        # Convert to WAV for Vosk (mono, 16kHz, 16-bit PCM)
+        try:
+            with tracing.span("stt ffmpeg convert"):
+                subprocess.run([
+                    "ffmpeg", "-y", "-i", str(webm_path),
+                    "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", str(wav_path)
+                ], check=True)
+        except subprocess.CalledProcessError as e:
+            print(f"[FFmpeg] WAV conversion failed: {e}")
+            return jsonify({"error": "Audio conversion failed"}), 500
+
+        # Transcribe the WAV using Vosk
+        result = transcribe_audio(wav_path)
+    finally:
+        tracing.finish(trace)
+
+    # the frontend hands request_id back with the user_message, the pipeline trace continues under it
+    return jsonify({ "transcript": result["text"], "request_id": trace.request_id if trace else None })
 
 ########################################################################################
 """############################       Nutrition        ##############################"""
@@ -665,11 +560,20 @@ def login():
     token = request.args.get("token", "").strip()
     if token in ALLOWED_KEYS:
         session['authenticated'] = True
+        session['chat_id'] = uuid.uuid4().hex
         print("[Login] Successful.")
         return redirect(url_for('index'))
     print("[Login] Refused.")
     return jsonify({"error": "Unauthorized"}), 403
 
+# chat session of the current user (services/chat_sessions.py)
+# HTTP requests only: check_access assigns it, so it lands in the cookie before the socket connects.
+# Socket handlers read session['chat_id'] and must not create one (their session copy isn't saved).
+def current_chat_id() -> str:
+    if 'chat_id' not in session:
+        session['chat_id'] = uuid.uuid4().hex
+    return session['chat_id']
+
 # check user authentication
 @mira.before_request
 def check_access():
@@ -681,6 +585,7 @@ def check_access():
 
     if session.get('authenticated'):
         #print("[BeforeRequest] Authenticated.")
+        current_chat_id()
         return None
 
     print("[BeforeRequest] Refused unauthorized access.")
@@ -733,6 +638,7 @@ if __name__ == '__main__':
     check_mkcert()
     load_plugs_from_db()
     discover_playlists()
+    WeatherCache.start_refresh(GetDB.get_location) # keeps the forecast warm for weather questions
     # Start Flask
     # HTTPS server
     flask_thread = threading.Thread(target=run_https_flask, daemon=True)
@@ -740,9 +646,11 @@ if __name__ == '__main__':
     # HTTP server
     http_thread = threading.Thread(target=run_http_flask, daemon=True)
     http_thread.start()
-    # Init text LLM and create a chat session
+    # Init text LLM (chat sessions are created per user on their first message)
     init_qwen()
-    ChatContext.chat_session = ChatSession()
+    init_qwen_utility() # optional small model for helper prompts
+    init_embed() # optional intent classifier
+    IntentEmbedIndex.start_build() # embeds the intent_action history in the background
     # Init TTS
     init_tts() # XTTS-v2
     get_vosk_model() # Vosk
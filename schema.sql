@@ -40,6 +40,8 @@ CREATE TABLE IF NOT EXISTS settings (
   llm_mode            TEXT,
   llm_vl              TEXT,
   llm_vl_mode         TEXT,
+  llm_utility         TEXT,
+  llm_utility_mode    TEXT,
   tts                 TEXT,
   tts_mode            TEXT,
   smart_plug1_name    TEXT,
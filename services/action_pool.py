@@ -0,0 +1,81 @@
+# services.action_pool.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Callable
+from services.command_library import command_lookup
+from services import tracing
+
+"""
+Dispatched intent actions (VLC, Tasmota, list writes) run on a bounded worker pool, in parallel with the chat pass.
+    - Every action has a deadline (ACTION_TIMEOUTS); when it passes, the action is reported as timed out.
+      The worker itself can't be interrupted, so the blocking calls carry their own timeouts
+      (smart_plugs.PLUG_TIMEOUT, media.vlc_request).
+    - SERIAL_COMMANDS change state the chat pass of the same message reads (chat session, attachment),
+      they run inline before it.
+    - on_done(command, status) is called exactly once per action: "ok", "invalid", "failed" or "timeout".
+"""
+ACTION_WORKERS = 4
+ACTION_TIMEOUT = 10 # seconds
+ACTION_TIMEOUTS = {
+    # may need a listify pass on the LLM
+    "new ShoppingList": 90, "append ShoppingList": 90,
+    "new ToDoList": 90, "append ToDoList": 90,
+}
+SERIAL_COMMANDS = {"new chat", "new conversation", "remove attachment"}
+
+_pool = ThreadPoolExecutor(max_workers=ACTION_WORKERS, thread_name_prefix="action")
+OnDone = Callable[[str, str], None]
+
+class _ActionRun:
+    def __init__(self, command: str, on_done: OnDone):
+        self.command = command
+        self.on_done = on_done
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def report(self, status: str):
+        with self._lock:
+            if self._reported:
+                return
+            self._reported = True
+        if status != "ok":
+            print(f"[Actions] {self.command}: {status}")
+        self.on_done(self.command, status)
+
+def _run(action: _ActionRun, user_msg: str, chat_id: str, items: list):
+    with tracing.span("action", command=action.command) as span:
+        try:
+            ok = command_lookup(action.command, user_msg, chat_id, items)
+            span["status"] = "ok" if ok else "invalid"
+        except Exception as e:
+            print(f"[Actions] {action.command} raised: {e}")
+            span["status"] = "failed"
+    action.report(span["status"])
+
+def _run_attached(trace, *args):
+    with tracing.attached(trace):
+        _run(*args)
+
+def dispatch(command: str, user_msg: str, chat_id: str, items: list, on_done: OnDone) -> Future:
+    """Runs command_lookup for command on the pool (inline for SERIAL_COMMANDS). Returns its future."""
+    action = _ActionRun(command, on_done)
+    if command in SERIAL_COMMANDS:
+        future = Future()
+        _run(action, user_msg, chat_id, items)
+        future.set_result(None)
+        return future
+
+    future = _pool.submit(_run_attached, tracing.fork(), action, user_msg, chat_id, items)
+    deadline = threading.Timer(ACTION_TIMEOUTS.get(command, ACTION_TIMEOUT), action.report, args=("timeout",))
+    deadline.daemon = True
+    deadline.start()
+    future.add_done_callback(lambda _: deadline.cancel())
+    return future
+
+def wait_all(futures: list, timeout: float = None):
+    """Blocks until all futures finished or timeout (default: the longest action deadline) passed."""
+    if futures:
+        if timeout is None:
+            timeout = max(ACTION_TIMEOUT, *ACTION_TIMEOUTS.values())
+        wait(futures, timeout=timeout)
@@ -0,0 +1,112 @@
+# services.chat_sessions.py
+
+import json
+import pickle
+import threading
+from collections import OrderedDict
+import services.config as config
+from services.llm_chat import ChatSession
+
+"""
+One ChatSession per authenticated Flask session (session["chat_id"]).
+    - Resident sessions are capped by count and by memory (history + their llama state in the prompt cache).
+    - Idle sessions are LRU evicted: history goes to SESSION_DIR/<chat_id>.json, the llama state is
+      moved out of the prompt cache into SESSION_DIR/<chat_id>.state.
+    - The next message restores both, so the history prefix doesn't need a re-prefill.
+    - Two active users normally stay resident; their states simply live side by side in the prompt cache.
+"""
+SESSION_DIR = config.BASE_PATH / "temp" / "sessions"
+MAX_RESIDENT_SESSIONS = 4
+MAX_RESIDENT_BYTES = 3 << 30 # 3GB
+
+class ChatRegistry:
+    _lock = threading.RLock()
+    _sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+
+    @classmethod
+    def get(cls, chat_id: str) -> ChatSession:
+        """Returns the session for chat_id: resident, restored from disk or new."""
+        with cls._lock:
+            session = cls._sessions.get(chat_id)
+            if session is not None:
+                cls._sessions.move_to_end(chat_id)
+                return session
+            session = cls._restore(chat_id) or ChatSession()
+            cls._sessions[chat_id] = session
+            cls._enforce_limits()
+            return session
+
+    @classmethod
+    def reset(cls, chat_id: str) -> ChatSession:
+        """Starts a new conversation for chat_id."""
+        with cls._lock:
+            cls._sessions.pop(chat_id, None)
+            for suffix in (".json", ".state"):
+                (SESSION_DIR / f"{chat_id}{suffix}").unlink(missing_ok=True)
+            session = ChatSession()
+            cls._sessions[chat_id] = session
+            cls._enforce_limits()
+            return session
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._lock:
+            return {
+                "resident": len(cls._sessions),
+                "resident_bytes": sum(cls._memory(s) for s in cls._sessions.values()),
+            }
+
+    @classmethod
+    def _memory(cls, session: ChatSession) -> int:
+        history = sum(len(m["content"]) for m in session.history)
+        cache = config.llm.cache if config.llm is not None else None
+        state = cache.state_size(session.state_key) if cache is not None and session.state_key else 0
+        return history + state
+
+    @classmethod
+    def _enforce_limits(cls):
+        # never evict the session that was just used (last entry)
+        while len(cls._sessions) > 1 and (
+                len(cls._sessions) > MAX_RESIDENT_SESSIONS or
+                sum(cls._memory(s) for s in cls._sessions.values()) > MAX_RESIDENT_BYTES):
+            chat_id, session = cls._sessions.popitem(last=False)
+            cls._evict(chat_id, session)
+
+    @classmethod
+    def _evict(cls, chat_id: str, session: ChatSession):
+        SESSION_DIR.mkdir(parents=True, exist_ok=True)
+        with open(SESSION_DIR / f"{chat_id}.json", "w", encoding="utf-8") as f:
+            json.dump(session.snapshot(), f, ensure_ascii=False)
+
+        state_path = SESSION_DIR / f"{chat_id}.state"
+        cache = config.llm.cache if config.llm is not None else None
+        state = cache.pop_state(session.state_key) if cache is not None and session.state_key else None
+        if state is not None:
+            with open(state_path, "wb") as f:
+                pickle.dump(state, f)
+        else:
+            state_path.unlink(missing_ok=True)
+        print(f"[Sessions] Evicted {chat_id} ({'with' if state is not None else 'without'} llama state).")
+
+    @classmethod
+    def _restore(cls, chat_id: str):
+        json_path = SESSION_DIR / f"{chat_id}.json"
+        if not json_path.exists():
+            return None
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                session = ChatSession(snapshot=json.load(f))
+        except Exception as e:
+            print(f"[Sessions] Failed to restore {chat_id}: {e}")
+            return None
+
+        state_path = SESSION_DIR / f"{chat_id}.state"
+        cache = config.llm.cache if config.llm is not None else None
+        if state_path.exists() and cache is not None and session.state_key:
+            try:
+                with open(state_path, "rb") as f:
+                    cache[session.state_key] = pickle.load(f)
+            except Exception as e:
+                print(f"[Sessions] Failed to restore llama state for {chat_id}: {e}")
+        print(f"[Sessions] Restored {chat_id}.")
+        return session
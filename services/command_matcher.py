@@ -0,0 +1,100 @@
+# services.command_matcher.py
+
+import threading
+from typing import Optional
+from services.intent_recall import normalize_message
+from services.prompts_system import get_intent_commands, get_intent_list_commands
+
+"""
+Deterministic fast path ahead of the intent LLM: utterances that are exactly one command ("pause playback",
+"next song", "turn on the lamp", "play <playlist>") resolve with a single dict lookup.
+    - Phrases are built from get_intent_commands() (static commands, PLUGS, PLAYLIST_STEM) plus ALIASES and
+      rebuilt when the command set changes.
+    - Tokens go through MISHEARINGS (common Vosk errors) and FILLER words are dropped before the lookup.
+    - Only whole-utterance matches count: leftover text (chat, list items) or a phrase that maps to two
+      commands falls through to the LLM.
+    - List commands (need items) and "get weather" (needs the forecast prompt) are left to the LLM.
+"""
+MATCHER_ENABLED = True
+EXCLUDED_COMMANDS = {"get weather"} # plus the list commands
+
+ALIASES = {
+    "new chat": ["start a new chat", "start new chat", "new session"],
+    "play music": ["play", "resume", "resume playback", "resume music", "continue playback"],
+    "pause playback": ["pause", "pause music", "stop music", "stop playback", "pause song"],
+    "next song": ["next", "skip", "skip song", "next track", "skip this song", "next one"],
+    "previous song": ["previous", "previous track", "last song", "go back a song"],
+    "remove attachment": ["clear attachment", "delete attachment", "drop attachment"],
+}
+# Vosk (gigaspeech) mis-hearings seen on the short commands
+MISHEARINGS = {
+    "paws": "pause", "pores": "pause", "pours": "pause", "posts": "pause",
+    "necks": "next", "nekst": "next", "nix": "next",
+    "sung": "song", "sawn": "song",
+    "previews": "previous",
+    "episodes": "episode",
+    "of": "off",
+    "own": "on",
+}
+# dropped anywhere in the utterance
+FILLER = {"please", "mira", "hey", "the", "a", "my", "now", "thanks", "thank", "you", "can", "could", "would"}
+
+def normalize_command_text(text: str) -> list[str]:
+    words = [MISHEARINGS.get(w, w) for w in normalize_message(text.replace("_", " ").replace("-", " ")).split()]
+    return [w for w in words if w not in FILLER]
+
+def _plug_phrases(state: str, name: str) -> list[str]:
+    return [f"{state} {name}", f"{name} {state}",
+            f"turn {state} {name}", f"turn {name} {state}",
+            f"switch {state} {name}", f"switch {name} {state}"]
+
+class CommandMatcher:
+    _lock = threading.Lock()
+    _phrases = {}        # normalized phrase -> command, None if ambiguous
+    _signature = None    # command set the phrase table was built against
+
+    @classmethod
+    def match(cls, user_msg: str) -> Optional[str]:
+        """Returns the single command user_msg consists of, or None (caller runs the LLM)."""
+        if not MATCHER_ENABLED:
+            return None
+        key = " ".join(normalize_command_text(user_msg))
+        if not key:
+            return None
+        with cls._lock:
+            cls._ensure_phrases()
+            command = cls._phrases.get(key)
+        if command is not None:
+            print(f"[Matcher] '{user_msg}' -> {command}")
+        return command
+
+    @classmethod
+    def _ensure_phrases(cls):
+        signature = tuple(get_intent_commands())
+        if cls._signature == signature:
+            return
+        cls._phrases = {}
+        excluded = EXCLUDED_COMMANDS | set(get_intent_list_commands())
+        for command in signature:
+            if command in excluded:
+                continue
+            state, _, rest = command.partition(" ")
+            if state in ("on", "off"):
+                phrases = _plug_phrases(state, rest)
+            elif state == "play":
+                phrases = [command, f"{command} playlist", f"play playlist {rest}"]
+            else:
+                phrases = [command]
+            for phrase in phrases + ALIASES.get(command, []):
+                cls._add(" ".join(normalize_command_text(phrase)), command)
+        cls._signature = signature
+        print(f"[Matcher] Phrase table built: {len(cls._phrases)} phrases for {len(signature)} commands.")
+
+    @classmethod
+    def _add(cls, phrase: str, command: str):
+        if not phrase:
+            return
+        if phrase in cls._phrases and cls._phrases[phrase] != command:
+            cls._phrases[phrase] = None # e.g. a playlist named "music": let the LLM decide
+            return
+        cls._phrases[phrase] = command
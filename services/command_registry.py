@@ -0,0 +1,89 @@
+# services.command_registry.py
+
+import threading
+from typing import Callable, Optional
+
+"""
+Command registry: modules (and addons) register their intent commands here instead of editing
+command_library.py and the intent prompt.
+    CommandRegistry.register("media", {"pause playback": lambda call: media_pause()}, prompt=["pause playback"])
+    - A group is registered as a whole and replaced on re-registration (plugs and playlists re-register when
+      the settings/playlist dir change).
+    - handler(call) gets a CommandCall (command, user_msg, chat_id, items). A None handler marks a command the
+      message pipeline answers itself (get weather).
+    - items=True: the intent object carries the extracted list items (grammar, listify fallback).
+    - prompt: the lines for the intent system prompt, defaults to the command names.
+    - Every change bumps version; the intent prompt and grammar are rebuilt from it.
+"""
+Handler = Optional[Callable[["CommandCall"], object]]
+
+class CommandCall:
+    def __init__(self, command: str, user_msg: str, chat_id: str = None, items: list = None):
+        self.command = command
+        self.user_msg = user_msg
+        self.chat_id = chat_id
+        self.items = items
+
+class _Group:
+    def __init__(self, handlers: dict, prompt: list, items: bool):
+        self.handlers = handlers
+        self.prompt = prompt
+        self.items = items
+
+class CommandRegistry:
+    _lock = threading.RLock()
+    _groups: "dict[str, _Group]" = {}
+    _handlers: "dict[str, Handler]" = {}  # command -> handler, flattened over all groups
+    _names: tuple = ()
+    _item_commands: tuple = ()
+    version = 0
+
+    @classmethod
+    def register(cls, group: str, handlers: dict, prompt: list = None, items: bool = False):
+        """Registers (or replaces) the commands of group."""
+        with cls._lock:
+            cls._groups[group] = _Group(dict(handlers), list(prompt) if prompt is not None else list(handlers), items)
+            cls._rebuild()
+
+    @classmethod
+    def unregister(cls, group: str):
+        with cls._lock:
+            if cls._groups.pop(group, None) is not None:
+                cls._rebuild()
+
+    @classmethod
+    def dispatch(cls, call: CommandCall) -> bool:
+        """Runs the handler for call.command. False if the command isn't registered or has no handler."""
+        handler = cls._handlers.get(call.command)
+        if handler is None:
+            return False
+        handler(call)
+        return True
+
+    @classmethod
+    def commands(cls) -> tuple:
+        """All registered command names, in registration order."""
+        return cls._names
+
+    @classmethod
+    def item_commands(cls) -> tuple:
+        return cls._item_commands
+
+    @classmethod
+    def prompt_lines(cls) -> list[str]:
+        with cls._lock:
+            return [line for group in cls._groups.values() for line in group.prompt]
+
+    @classmethod
+    def _rebuild(cls):
+        handlers = {}
+        for name, group in cls._groups.items():
+            for command, handler in group.handlers.items():
+                if command in handlers:
+                    print(f"[Commands] '{command}' of {name} is already registered, ignored.")
+                    continue
+                handlers[command] = handler
+        cls._handlers = handlers
+        cls._names = tuple(handlers)
+        cls._item_commands = tuple(c for group in cls._groups.values() if group.items for c in group.handlers)
+        cls.version += 1
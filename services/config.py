@@ -2,12 +2,15 @@
 
 import os
 import socket
+import threading
 import sys, io
 from contextlib import contextmanager
 from pathlib import Path
 from llama_cpp import Llama
 from llama_cpp.llama_chat_format import Qwen3VLChatHandler
+from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
 from services.db_get import GetDB
+from services.llm_cache import PromptCache
 
 ########################################################################################
 """############################        System          ##############################"""
@@ -93,6 +96,16 @@ def suppress_stdout_stderr():
 llm = None
 MODEL_PATH = BASE_PATH / "Qwen3-8B-UD-Q6_K_XL.gguf"
 MAX_CONTEXT = 8192 # TODO: Frontend setting and write to DB
+# Prompt state cache: keeps the evaluated KV prefix per system prompt and for the chat history
+PROMPT_CACHE_RAM_BYTES = 2 << 30 # 2GB
+PROMPT_CACHE_DISK_BYTES = 8 << 30 # 8GB; 0 disables the disk tier
+PROMPT_CACHE_DIR = BASE_PATH / "temp" / "prompt_cache"
+# Prompt lookup (n-gram) speculative decoding, used for attachment grounded chat turns.
+# llama-cpp-python keeps logits for every position once a draft model is set (n_ctx * n_vocab floats),
+# so it's opt-in. See services/llm_speculative.py for the benchmark.
+SPECULATIVE_LOOKUP = False
+SPECULATIVE_NUM_PRED_TOKENS = 10
+prompt_lookup = None
 
 def init_qwen():
     """
@@ -105,7 +118,9 @@ def init_qwen():
     else:
         gpu_layers = -1
 
-    global llm
+    global llm, prompt_lookup
+    if SPECULATIVE_LOOKUP:
+        prompt_lookup = LlamaPromptLookupDecoding(num_pred_tokens=SPECULATIVE_NUM_PRED_TOKENS)
 
     with suppress_stdout_stderr(): # remove this wrap for debug info if model crashes
         llm = Llama(
@@ -122,9 +137,113 @@ def init_qwen():
             use_mmap=False,
             verbose=True,
             chat_format="chatml",
+            draft_model=prompt_lookup,
         )
+    # speculative decoding is switched on per call (services/llm_speculative.py)
+    llm.draft_model = None
+    llm.set_cache(PromptCache(PROMPT_CACHE_RAM_BYTES, PROMPT_CACHE_DISK_BYTES, PROMPT_CACHE_DIR))
     print("[LLM] Model initialized and warmed up.")
 
+########################################################################################
+"""############################      Utility LLM       ##############################"""
+########################################################################################
+# Optional small model for the short helper prompts (intent, keygen, query rewrite, listify, weather).
+# Selected by settings.llm_utility ("none" keeps everything on the 8B), CPU/GPU by settings.llm_utility_mode.
+# python -m services.eval_intent compares latency/accuracy of both models on the intent pass.
+llm_utility = None
+UTILITY_MODELS = {
+    "qwen3_1.7b": BASE_PATH / "Qwen3-1.7B-UD-Q8_K_XL.gguf",
+    "qwen3_0.6b": BASE_PATH / "Qwen3-0.6B-UD-Q8_K_XL.gguf",
+}
+UTILITY_CONTEXT = 4096
+UTILITY_CACHE_RAM_BYTES = 512 << 20 # 512MB
+# Which model serves which scheduler task: "utility" falls back to "main" if no utility model is loaded.
+LLM_ROUTES = {
+    "intent": "utility",
+    "listify": "utility",
+    "wikipedia": "utility",
+    "web": "utility",
+    "weather": "utility",
+    "chat": "main",
+}
+
+def init_qwen_utility():
+    """
+    Initialize the utility model at startup (if one is selected).
+    """
+    name = GetDB.get_llm_utility()
+    model_path = UTILITY_MODELS.get(name)
+    if model_path is None:
+        print("[LLM Utility] None selected, helper prompts run on the main model.")
+        return
+    if not model_path.exists():
+        print(f"[LLM Utility] {model_path.name} not found, helper prompts run on the main model.")
+        return
+    mode = GetDB.get_llm_utility_mode()
+    print(f"[LLM Utility] {name} initializing on {mode}...")
+    if mode == "cpu":
+        gpu_layers = 0
+    else:
+        gpu_layers = -1
+
+    global llm_utility
+    with suppress_stdout_stderr(): # remove this wrap for debug info if model crashes
+        llm_utility = Llama(
+            model_path=str(model_path),
+            n_ctx=UTILITY_CONTEXT,
+            n_threads=16,
+            n_gpu_layers=gpu_layers,
+            temperature=0.7,
+            top_p=0.8,
+            top_k=20,
+            use_mmap=False,
+            verbose=True,
+            chat_format="chatml",
+        )
+    llm_utility.set_cache(PromptCache(UTILITY_CACHE_RAM_BYTES))
+    print("[LLM Utility] Model initialized and warmed up.")
+
+def route_model(task: str) -> str:
+    """Resolves LLM_ROUTES for task to "main" or "utility" (only if the utility model is loaded)."""
+    if LLM_ROUTES.get(task, "main") == "utility" and llm_utility is not None:
+        return "utility"
+    return "main"
+
+def get_model(route: str):
+    return llm_utility if route == "utility" else llm
+
+########################################################################################
+"""############################     Embedding LLM      ##############################"""
+########################################################################################
+# Optional nearest neighbour intent classifier (services/intent_embed.py) ahead of the generative intent pass.
+# python -m services.eval_intent compares it against the generative path.
+llm_embed = None
+INTENT_EMBED_CLASSIFIER = False
+MODEL_PATH_EMBED = BASE_PATH / "Qwen3-Embedding-0.6B-Q8_0.gguf"
+
+def init_embed():
+    """
+    Initialize the embedding model at startup (if the classifier is enabled).
+    """
+    if not INTENT_EMBED_CLASSIFIER:
+        return
+    if not MODEL_PATH_EMBED.exists():
+        print(f"[LLM Embed] {MODEL_PATH_EMBED.name} not found, intent classifier disabled.")
+        return
+    print("[LLM Embed] Model initializing on cpu...")
+
+    global llm_embed
+    with suppress_stdout_stderr(): # remove this wrap for debug info if model crashes
+        llm_embed = Llama(
+            model_path=str(MODEL_PATH_EMBED),
+            embedding=True,
+            n_ctx=512,
+            n_threads=8,
+            n_gpu_layers=0,
+            verbose=True,
+        )
+    print("[LLM Embed] Model initialized and warmed up.")
+
 ########################################################################################
 """############################        VL LLM          ##############################"""
 ########################################################################################
@@ -163,16 +282,8 @@ def init_qwen_vl():
 ########################################################################################
 """############################         Chat           ##############################"""
 ########################################################################################
-# Rolling context window for chat
-class ChatContext:
-    chat_session = None
-
-# TODO: Turn into proper state handler and enable multi-user support
-class ChatState:
-    intent = None
-    user_msg = None
-    weather = None
-    picture = None
+# Chat sessions (one per user) live in services/chat_sessions.py ChatRegistry,
+# the per-message state in services/pipeline.py MessagePipeline.
 
 ########################################################################################
 """############################        Files           ##############################"""
@@ -181,6 +292,7 @@ class ChatState:
 class HasAttachment:
     _has_attachment = False
     _is_picture = False
+    _lock = threading.Lock()
 
     @classmethod
     def set_attachment(cls, value: bool):
@@ -203,6 +315,17 @@ class HasAttachment:
         cls._has_attachment = False
         cls._is_picture = False
 
+    @classmethod
+    def consume(cls) -> tuple[bool, bool]:
+        """
+        Returns (has_attachment, is_picture) and clears both: exactly one message gets the attachment.
+        """
+        with cls._lock:
+            state = (cls._has_attachment, cls._is_picture)
+            cls._has_attachment = False
+            cls._is_picture = False
+            return state
+
 class FileSupport:
     # rtf we convert with a small function ourselves, PDF by pdfminer.six
     BASE_EXTENSIONS = {
@@ -230,6 +230,7 @@ def init_db() -> None:
             conn.execute("""
                 INSERT INTO settings (
                     id, stt, stt_mode, llm, llm_mode, llm_vl, llm_vl_mode,
+                    llm_utility, llm_utility_mode,
                     tts, tts_mode,
                     smart_plug1_name, smart_plug1_ip,
                     smart_plug2_name, smart_plug2_ip,
@@ -243,6 +244,7 @@ def init_db() -> None:
                 )
                 VALUES (
                     1, 'vosk', 'cpu', 'qwen3', 'gpu', 'qwen3_vl', 'cpu',
+                    'none', 'cpu',
                     'xtts_v2', 'gpu',
                     '', '', '', '', '', '', '', '',
                     'User', 'Birthday',
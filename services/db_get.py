@@ -128,6 +128,14 @@ class GetDB:
     def get_llm_mode():
         return GetDB._get_single_value("llm_mode")
 
+    @staticmethod
+    def get_llm_utility():
+        return GetDB._get_single_value("llm_utility")
+
+    @staticmethod
+    def get_llm_utility_mode():
+        return GetDB._get_single_value("llm_utility_mode")
+
     @staticmethod
     def get_llm_vl():
         return GetDB._get_single_value("llm_vl")
@@ -0,0 +1,132 @@
+# services.eval_intent.py
+
+import sys
+import time
+import statistics
+import services.config as config
+from services.db_access import connect
+from services.intent_recall import parse_intent_response, normalize_message
+from services.intent_embed import IntentEmbedIndex
+from services.llm_intent import build_intent_messages, get_intent_grammar
+import services.command_library # registers every command group, like mira does (prompt and grammar need all of them)
+
+"""
+Latency/accuracy of the intent pass: generative on the main and the utility model, and the embedding classifier.
+    - EVAL_CASES: hand labelled messages (expected (intent, command) pairs, chat = None).
+    - Plus the latest EVAL_DB_ROWS intent_action rows, labelled with what the main model decided back then.
+    - A case counts as correct if the (intent, command) pairs match, order ignored.
+    - The embedding classifier only answers some cases (coverage); deferred cases would run the generative
+      pass, so its accuracy is reported over the answered ones. Its index leaves out the evaluated messages.
+    python -m services.eval_intent [rows]
+"""
+EVAL_CASES = [
+    ("next song", [("action", "next song")]),
+    ("skip this episode", [("action", "next episode")]),
+    ("pause", [("action", "pause playback")]),
+    ("start a new chat", [("action", "new chat")]),
+    ("get rid of the attachment", [("action", "remove attachment")]),
+    ("what's the weather like tomorrow?", [("action", "get weather")]),
+    ("add milk and eggs to the shopping list", [("action", "append ShoppingList")]),
+    ("new todo list: call mom, pay rent", [("action", "new ToDoList")]),
+    ("play some music and tell me a joke", [("action", "play music"), ("chat", None)]),
+    ("who wrote the hobbit?", [("chat", None)]),
+    ("how do I boil an egg", [("chat", None)]),
+]
+EVAL_DB_ROWS = 50
+
+def _pairs(objects: list[dict]) -> list:
+    return sorted((
+        (o.get("intent"), o.get("command") if o.get("intent") == "action" else None)
+        for o in objects
+    ), key=str)
+
+def load_cases(db_rows: int = EVAL_DB_ROWS) -> list:
+    cases = [(msg, sorted(expected, key=str)) for msg, expected in EVAL_CASES]
+    with connect(readonly=True) as conn:
+        rows = conn.execute(
+            "SELECT user_msg, assistant_resp FROM intent_action ORDER BY id DESC LIMIT ?", (db_rows,)
+        ).fetchall()
+    for user_msg, assistant_resp in rows:
+        try:
+            objects = parse_intent_response(assistant_resp)
+        except ValueError:
+            continue
+        if user_msg and objects:
+            cases.append((user_msg, _pairs(objects)))
+    return cases
+
+def evaluate(llm, cases: list) -> dict:
+    latencies = []
+    correct = 0
+    for user_msg, expected in cases:
+        start = time.perf_counter()
+        response = llm.create_chat_completion(messages=build_intent_messages(user_msg),
+                                              grammar=get_intent_grammar(), temperature=0.0)
+        latencies.append(time.perf_counter() - start)
+        try:
+            got = _pairs(parse_intent_response(response["choices"][0]["message"]["content"]))
+        except ValueError:
+            got = None
+        if got == sorted(expected, key=str):
+            correct += 1
+        elif config.DEBUG:
+            print(f"[Eval] {user_msg!r}: expected {expected}, got {got}")
+    return {"cases": len(cases), "accuracy": round(correct / len(cases), 3) if cases else 0.0, **_latency(latencies)}
+
+def evaluate_embedding(cases: list) -> dict:
+    IntentEmbedIndex.rebuild(exclude={normalize_message(msg) for msg, _ in cases})
+    latencies = []
+    answered = 0
+    correct = 0
+    for user_msg, expected in cases:
+        start = time.perf_counter()
+        command = IntentEmbedIndex.classify(user_msg)
+        latencies.append(time.perf_counter() - start)
+        if command is None:
+            continue
+        answered += 1
+        if [("action", command)] == expected:
+            correct += 1
+        elif config.DEBUG:
+            print(f"[Eval] {user_msg!r}: expected {expected}, got {command}")
+    return {
+        "cases": len(cases),
+        "coverage": round(answered / len(cases), 3) if cases else 0.0,
+        "accuracy": round(correct / answered, 3) if answered else 0.0,
+        **_latency(latencies),
+    }
+
+def _latency(latencies: list) -> dict:
+    if not latencies:
+        return {"mean_s": 0.0, "p50_s": 0.0, "p95_s": 0.0}
+    ordered = sorted(latencies)
+    return {
+        "mean_s": round(statistics.mean(ordered), 4),
+        "p50_s": round(statistics.median(ordered), 4),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+    }
+
+if __name__ == "__main__":
+    from services.smart_plugs import load_plugs_from_db
+    from services.media import discover_playlists
+
+    load_plugs_from_db()
+    discover_playlists()
+    cases = load_cases(int(sys.argv[1]) if len(sys.argv) > 1 else EVAL_DB_ROWS)
+    config.init_qwen()
+    config.init_qwen_utility()
+    for route in ("main", "utility"):
+        llm = config.get_model(route)
+        if llm is None:
+            print(f"[Eval] {route}: not loaded (settings.llm_utility), skipped.")
+            continue
+        llm.set_cache(None) # measure the full prefill, like a cold command
+        evaluate(llm, cases[:1]) # warm up
+        print(f"[Eval] {route}: {evaluate(llm, cases)}")
+
+    config.INTENT_EMBED_CLASSIFIER = True
+    config.init_embed()
+    if config.llm_embed is None:
+        print("[Eval] embedding: model not found, skipped.")
+    else:
+        print(f"[Eval] embedding: {evaluate_embedding(cases)}")
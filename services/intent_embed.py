@@ -0,0 +1,207 @@
+# services.intent_embed.py
+
+import threading
+from collections import deque
+from typing import Optional
+import numpy as np
+import services.config as config
+from services.db_access import connect
+from services.intent_recall import normalize_message, parse_intent_response
+from services.prompts_system import get_intent_commands
+
+"""
+Embedding classifier (config.INTENT_EMBED_CLASSIFIER): nearest neighbour over labelled examples, ahead of the
+generative intent pass.
+    - Examples: every command string plus intent_action rows that resolved to a single object
+      (one action with a live command, or chat: label None, so chat-like messages defer).
+    - A message takes the label of its nearest example if the similarity is >= EMBED_THRESHOLD and no example
+      with a different label is within EMBED_MARGIN. Everything else defers to the LLM.
+    - The index is built on a background thread (start_build, at startup and whenever PLUGS/playlists change);
+      classify() defers to the LLM until it is ready, so no request waits for the history to be embedded.
+    - Vectors are cached per example text: on a rebuild only new texts are embedded, vectors of texts that
+      left the history and the command set are dropped.
+    - The history is the latest EMBED_HISTORY_MAX intent_action rows; fresh LLM decisions are added with learn().
+"""
+EMBED_THRESHOLD = 0.86
+EMBED_MARGIN = 0.03
+EMBED_HISTORY_MAX = 2000
+EMBED_BATCH = 64 # texts per embed call while building, classify() never waits for more than one batch
+
+class IntentEmbedIndex:
+    _lock = threading.Lock()
+    _model_lock = threading.Lock() # config.llm_embed is a single llama.cpp context
+    _vectors = {}        # example text -> unit vector (kept across rebuilds)
+    _examples = {}       # example text -> command, None for chat
+    _matrix = None       # stacked vectors of _examples
+    _labels = []
+    _signature = None    # command set the index was built against
+    _history = None      # deque of (normalized msg, command or None) from intent_action
+    _building = False
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return config.INTENT_EMBED_CLASSIFIER and config.llm_embed is not None
+
+    @classmethod
+    def classify(cls, user_msg: str) -> Optional[str]:
+        """Returns the command for user_msg or None (caller runs the LLM, also while the index is building)."""
+        if not cls.enabled():
+            return None
+        key = normalize_message(user_msg)
+        if not key:
+            return None
+        with cls._lock:
+            stale = cls._signature != tuple(get_intent_commands())
+            matrix, labels = cls._matrix, cls._labels
+        if stale:
+            cls.start_build()
+            return None
+        if matrix is None:
+            return None
+        scores = matrix @ cls._embed([key])[0]
+        best = int(np.argmax(scores))
+        command = labels[best]
+        if command is None or scores[best] < EMBED_THRESHOLD:
+            return None
+        for i in np.flatnonzero(scores >= scores[best] - EMBED_MARGIN):
+            if labels[i] != command:
+                return None
+        print(f"[Embed] '{key}' -> {command} ({scores[best]:.3f})")
+        return command
+
+    @classmethod
+    def learn(cls, user_msg: str, raw_response: str):
+        """Adds a fresh LLM decision (history only while the index is building)."""
+        if not cls.enabled():
+            return
+        with cls._lock:
+            if cls._history is None:
+                return
+            example = cls._example(normalize_message(user_msg), raw_response)
+            if example is None:
+                return
+            dropped = cls._history[0] if len(cls._history) == cls._history.maxlen else None
+            cls._history.append(example)
+            if cls._building or cls._signature is None:
+                return # the running build picks it up
+            if dropped is not None:
+                cls._forget(dropped[0])
+            if example[1] is not None and example[1] not in cls._signature:
+                return
+            known = example[0] in cls._vectors
+        vector = None if known else cls._embed([example[0]])[0]
+        with cls._lock:
+            if vector is not None:
+                cls._vectors[example[0]] = vector
+            cls._examples[example[0]] = example[1]
+            cls._restack()
+
+    @classmethod
+    def start_build(cls):
+        """Builds the index on a daemon thread (no-op while a build is running)."""
+        if not cls.enabled():
+            return
+        with cls._lock:
+            if cls._building:
+                return
+            cls._building = True
+        threading.Thread(target=cls._build, name="embed-index", daemon=True).start()
+
+    @classmethod
+    def rebuild(cls, exclude: set = frozenset()):
+        """Reloads the history from intent_action, leaving out the (normalized) messages in exclude, and builds
+        the index on this thread."""
+        with cls._lock:
+            cls._building = True
+            cls._history = None
+        cls._build(exclude)
+
+    @classmethod
+    def _build(cls, exclude: set = frozenset()):
+        try:
+            if cls._history is None:
+                history = deque(cls._load_history(exclude), maxlen=EMBED_HISTORY_MAX)
+                with cls._lock:
+                    cls._history = history
+            while True:
+                signature = tuple(get_intent_commands())
+                with cls._lock:
+                    examples = cls._collect(signature)
+                    missing = [text for text in examples if text not in cls._vectors]
+                    if not missing:
+                        keep = set(examples) | {key for key, _ in cls._history}
+                        cls._vectors = {text: v for text, v in cls._vectors.items() if text in keep}
+                        cls._examples = examples
+                        cls._signature = signature
+                        cls._restack()
+                        print(f"[Embed] Index built: {len(examples)} examples, {len(cls._vectors)} cached vectors.")
+                        return
+                # learn() and command changes during the batches are picked up by the next pass
+                for i in range(0, len(missing), EMBED_BATCH):
+                    batch = missing[i:i + EMBED_BATCH]
+                    vectors = cls._embed(batch)
+                    with cls._lock:
+                        cls._vectors.update(zip(batch, vectors))
+        except Exception as e:
+            print(f"[Embed] Index build failed: {e}")
+        finally:
+            with cls._lock:
+                cls._building = False
+
+    @classmethod
+    def _collect(cls, signature: tuple) -> dict:
+        valid = set(signature)
+        examples = {normalize_message(command): command for command in signature}
+        for key, command in cls._history:
+            if command is None or command in valid:
+                examples.setdefault(key, command)
+        return examples
+
+    @classmethod
+    def _forget(cls, key: str):
+        """Drops an example that fell out of the history (command strings stay)."""
+        if any(k == key for k, _ in cls._history) or key in {normalize_message(c) for c in cls._signature}:
+            return
+        cls._examples.pop(key, None)
+        cls._vectors.pop(key, None)
+
+    @classmethod
+    def _restack(cls):
+        texts = list(cls._examples)
+        cls._labels = [cls._examples[text] for text in texts]
+        cls._matrix = np.stack([cls._vectors[text] for text in texts]) if texts else None
+
+    @classmethod
+    def _load_history(cls, exclude: set = frozenset()) -> list:
+        with connect(readonly=True) as conn:
+            rows = conn.execute("SELECT user_msg, assistant_resp FROM intent_action ORDER BY id DESC LIMIT ?",
+                                (EMBED_HISTORY_MAX,)).fetchall()
+        history = []
+        for user_msg, assistant_resp in reversed(rows):
+            key = normalize_message(user_msg or "")
+            if key and key not in exclude:
+                example = cls._example(key, assistant_resp)
+                if example is not None:
+                    history.append(example)
+        return history
+
+    @staticmethod
+    def _example(key: str, raw_response: str) -> Optional[tuple]:
+        try:
+            objects = parse_intent_response(raw_response)
+        except (ValueError, TypeError):
+            return None
+        if len(objects) != 1:
+            return None # multi command messages can't be answered with a single label
+        obj = objects[0]
+        if obj.get("intent") == "chat":
+            return key, None
+        if obj.get("intent") == "action" and obj.get("command"):
+            return key, obj["command"]
+        return None
+
+    @classmethod
+    def _embed(cls, texts: list[str]) -> np.ndarray:
+        with cls._model_lock:
+            vectors = np.asarray(config.llm_embed.embed(texts), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
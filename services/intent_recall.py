@@ -0,0 +1,182 @@
+# services.intent_recall.py
+
+import re
+import json
+import threading
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Optional
+from services.db_access import connect
+from services.prompts_system import get_intent_commands
+
+"""
+Learned command recall (IsDetermined): intent_action records every user message with its resolved command.
+Repeated action-only messages ("next song", "on Lamp") are answered from that history instead of the LLM.
+    - Only responses made up purely of action objects are recalled (chat objects carry text for the chat route).
+    - A message must have resolved the same way RECALL_MIN_SEEN times with RECALL_MIN_AGREEMENT agreement.
+    - Near matches tolerate a single differing word: a plural, or a misspelled filler word. Words of command and
+      entity names (plugs, playlists) must match exactly, so "on lamp1" never recalls "on lamp2".
+    - The index is rebuilt whenever the command set (PLUGS, playlists) changes; commands that no longer
+      exist are dropped on rebuild.
+    - Hits are not written back to intent_action, so the table keeps counting only real LLM decisions.
+"""
+RECALL_ENABLED = True
+RECALL_MIN_SEEN = 2
+RECALL_MIN_AGREEMENT = 0.9
+RECALL_NEAR_WORD_RATIO = 0.8
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_message(text: str) -> str:
+    text = text.replace("/no_think", "").replace("/think", "")
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+def parse_intent_response(raw: str) -> list[dict]:
+    """
+    Parses a stored assistant_resp into a list of intent objects.
+    Older rows can hold a single JSON list/dict instead of JSONL.
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        return []
+    try:
+        obj = json.loads(raw)
+        objects = obj if isinstance(obj, list) else [obj]
+    except json.JSONDecodeError:
+        objects = []
+        for line in raw.splitlines():
+            if line.strip():
+                objects.append(json.loads(line))
+    return [o for o in objects if isinstance(o, dict)]
+
+class IntentRecall:
+    _lock = threading.Lock()
+    _index = {}          # normalized msg -> Counter(canonical JSONL response)
+    _by_length = {}      # word count -> set of normalized msgs (near match candidates)
+    _vocabulary = set()  # words of the command and entity names
+    _signature = None    # command set the index was built against
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def lookup(cls, user_msg: str) -> Optional[str]:
+        """
+        Returns the recalled JSONL response or None (caller runs the LLM).
+        """
+        if not RECALL_ENABLED:
+            return None
+        key = normalize_message(user_msg)
+        with cls._lock:
+            cls._ensure_index()
+            response, kind = cls._confident(key), "exact"
+            if response is None:
+                response, kind = cls._near(key), "near"
+            if response is None:
+                cls.misses += 1
+                return None
+            cls.hits += 1
+        print(f"[Recall] {kind} hit for '{key}' (hits={cls.hits}, misses={cls.misses})")
+        return response
+
+    @classmethod
+    def learn(cls, user_msg: str, raw_response: str):
+        """Adds a fresh LLM decision to the index (no-op until the index was built)."""
+        with cls._lock:
+            if cls._signature is None:
+                return
+            cls._add(normalize_message(user_msg), raw_response, set(cls._signature))
+
+    @classmethod
+    def stats(cls) -> dict:
+        total = cls.hits + cls.misses
+        return {
+            "entries": len(cls._index),
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "hit_rate": round(cls.hits / total, 3) if total else 0.0,
+        }
+
+    @classmethod
+    def _ensure_index(cls):
+        signature = tuple(get_intent_commands())
+        if cls._signature == signature:
+            return
+        cls._index = {}
+        cls._by_length = {}
+        valid = set(signature)
+        cls._vocabulary = {word for command in signature for word in normalize_message(command).split()}
+        with connect(readonly=True) as conn:
+            rows = conn.execute("SELECT user_msg, assistant_resp FROM intent_action").fetchall()
+        for user_msg, assistant_resp in rows:
+            cls._add(normalize_message(user_msg or ""), assistant_resp, valid)
+        cls._signature = signature
+        print(f"[Recall] Index built: {len(cls._index)} messages from {len(rows)} rows.")
+
+    @classmethod
+    def _add(cls, key: str, raw_response: str, valid_commands: set):
+        if not key:
+            return
+        try:
+            objects = parse_intent_response(raw_response)
+        except (json.JSONDecodeError, TypeError):
+            return
+        if not objects:
+            return
+        for obj in objects:
+            if obj.get("intent") != "action" or obj.get("command") not in valid_commands:
+                return
+        canonical = "\n".join(json.dumps(o, ensure_ascii=False) for o in objects)
+        cls._index.setdefault(key, Counter())[canonical] += 1
+        cls._by_length.setdefault(len(key.split()), set()).add(key)
+
+    @classmethod
+    def _confident(cls, key: str) -> Optional[str]:
+        counts = cls._index.get(key)
+        if not counts:
+            return None
+        response, seen = counts.most_common(1)[0]
+        if seen < RECALL_MIN_SEEN or seen / sum(counts.values()) < RECALL_MIN_AGREEMENT:
+            return None
+        return response
+
+    @classmethod
+    def _near(cls, key: str) -> Optional[str]:
+        """Best scoring candidate one word away; ties go to the alphabetically first message."""
+        words = key.split()
+        best, best_score = None, 0.0
+        for candidate in sorted(cls._by_length.get(len(words), ())):
+            diff = [(a, b) for a, b in zip(words, candidate.split()) if a != b]
+            if len(diff) != 1:
+                continue
+            score = cls._word_score(*diff[0])
+            if score > best_score:
+                response = cls._confident(candidate)
+                if response is not None:
+                    best, best_score = response, score
+        return _without_items(best) if best is not None else None
+
+    @classmethod
+    def _word_score(cls, a: str, b: str) -> float:
+        """1.0 for a plural, the similarity for misspelled filler words, 0.0 if the words may mean different things."""
+        if a in cls._vocabulary and b in cls._vocabulary:
+            return 0.0 # two different names
+        if _is_plural(a, b) or _is_plural(b, a):
+            return 1.0
+        if a in cls._vocabulary or b in cls._vocabulary:
+            return 0.0
+        ratio = SequenceMatcher(None, a, b).ratio()
+        return ratio if ratio >= RECALL_NEAR_WORD_RATIO else 0.0
+
+def _is_plural(word: str, plural: str) -> bool:
+    if plural in (word + "s", word + "es"):
+        return True
+    return word.endswith("y") and plural == word[:-1] + "ies"
+
+def _without_items(response: str) -> str:
+    """List items belong to the original message; drop them so the list command re-extracts."""
+    objects = parse_intent_response(response)
+    for obj in objects:
+        obj.pop("items", None)
+    return "\n".join(json.dumps(o, ensure_ascii=False) for o in objects)
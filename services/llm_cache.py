@@ -0,0 +1,129 @@
+# services.llm_cache.py
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+from llama_cpp import Llama
+from llama_cpp.llama_cache import BaseLlamaCache, LlamaDiskCache
+
+class PromptCache(BaseLlamaCache):
+    """
+    Two tier (RAM, then disk) LRU cache of evaluated llama states, keyed by token sequence.
+
+    llama-cpp-python asks the cache for the longest stored prefix of every prompt and restores that
+    state if it beats what's currently in the context. After generating it stores prompt+completion.
+    Intent, weather, listify, wikipedia, web and chat all share one context with different system prompts;
+    with this each of them (and the live chat history) keeps its evaluated prefix instead of evicting the others.
+
+    - A new entry replaces the RAM entries it extends (the previous chat turn): they are dropped, not spilled.
+    - RAM entries are LRU evicted by size; evicted entries spill to the disk tier (if enabled).
+    - Disk hits are promoted back to RAM.
+    - Guarded by a lock: the model thread and the chat session registry both touch it.
+    """
+    def __init__(self, ram_bytes: int, disk_bytes: int = 0, disk_dir: Optional[Path] = None):
+        super().__init__(ram_bytes)
+        self.ram: "OrderedDict[Tuple[int, ...], object]" = OrderedDict()
+        self.disk = None
+        if disk_bytes > 0 and disk_dir is not None:
+            self.disk = LlamaDiskCache(cache_dir=str(disk_dir), capacity_bytes=disk_bytes)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.superseded = 0
+        self._lock = threading.RLock()
+
+    @property
+    def cache_size(self) -> int:
+        return sum(state.llama_state_size for state in self.ram.values())
+
+    @staticmethod
+    def _longest(keys, key: Tuple[int, ...]) -> Tuple[Optional[Tuple[int, ...]], int]:
+        best_key, best_len = None, 0
+        for k in keys:
+            prefix_len = Llama.longest_token_prefix(k, key)
+            if prefix_len > best_len:
+                best_key, best_len = k, prefix_len
+        return best_key, best_len
+
+    def _find_longest_prefix_key(self, key: Tuple[int, ...]) -> Optional[Tuple[int, ...]]:
+        return self._longest(self.ram.keys(), key)[0]
+
+    def __getitem__(self, key: Sequence[int]):
+        key = tuple(key)
+        with self._lock:
+            ram_key, ram_len = self._longest(self.ram.keys(), key)
+            disk_key, disk_len = (None, 0)
+            if self.disk is not None:
+                disk_key, disk_len = self._longest(self.disk.cache.iterkeys(), key)
+
+            if disk_key is not None and disk_len > ram_len:
+                # promote: LlamaDiskCache pops on read
+                value = self.disk[disk_key]
+                self[disk_key] = value
+                self.disk_hits += 1
+                print(f"[PromptCache] Disk hit: {disk_len}/{len(key)} tokens restored.")
+                return value
+            if ram_key is None:
+                self.misses += 1
+                raise KeyError("Key not found")
+            self.ram.move_to_end(ram_key)
+            self.hits += 1
+            return self.ram[ram_key]
+
+    def __contains__(self, key: Sequence[int]) -> bool:
+        key = tuple(key)
+        with self._lock:
+            if self._find_longest_prefix_key(key) is not None:
+                return True
+            return self.disk is not None and key in self.disk
+
+    def __setitem__(self, key: Sequence[int], value) -> None:
+        key = tuple(key)
+        with self._lock:
+            if key in self.ram:
+                del self.ram[key]
+            # a state that is a strict prefix of the new one is outdated (previous turn of the same chat)
+            for old_key in [k for k in self.ram if len(k) < len(key) and key[:len(k)] == k]:
+                del self.ram[old_key]
+                self.superseded += 1
+            self.ram[key] = value
+            # evict least recently used, keep at least the entry we just stored
+            while self.cache_size > self.capacity_bytes and len(self.ram) > 1:
+                old_key, old_value = self.ram.popitem(last=False)
+                if self.disk is not None:
+                    self.disk[old_key] = old_value
+
+    def pop_state(self, key: Sequence[int]):
+        """
+        Removes and returns the RAM entry stored for key, or None.
+        Used to move a chat session's state out of RAM when the session is evicted.
+        """
+        with self._lock:
+            best_key = self._matching_key(tuple(key))
+            return self.ram.pop(best_key) if best_key is not None else None
+
+    def state_size(self, key: Sequence[int]) -> int:
+        """Bytes held in RAM for the entry stored for key."""
+        with self._lock:
+            best_key = self._matching_key(tuple(key))
+            return self.ram[best_key].llama_state_size if best_key is not None else 0
+
+    def _matching_key(self, key: Tuple[int, ...], slack: int = 4) -> Optional[Tuple[int, ...]]:
+        # the last sampled token(s) are never evaluated, so allow a few tokens difference at the end
+        best_key, best_len = self._longest(self.ram.keys(), key)
+        if best_key is None or best_len < len(key) - slack:
+            return None
+        return best_key
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ram_entries": len(self.ram),
+                "ram_bytes": self.cache_size,
+                "disk_bytes": self.disk.cache_size if self.disk is not None else 0,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "superseded": self.superseded,
+            }
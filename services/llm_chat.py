@@ -2,16 +2,30 @@
 
 import re
 import json
-from typing import Optional
+import time
+from typing import Optional, Callable
 from datetime import datetime
 from services.prompts_system import get_system_prompt_chat, get_system_prompt_weather
 from services.db_access import write_connection
+from services.db_get import GetDB
+from services.weather_answer import template_answer
+from services import llm_scheduler, tracing
+from services.llm_speculative import prompt_lookup
 import services.config as config
 
 logs = config.BASE_PATH / "logs"
 log_chat = logs / "chat.log"
 
 def ask_weather(user_msg: str) -> str:
+    # common questions are answered from the forecast data directly (services/weather_answer.py)
+    try:
+        location = GetDB.get_location()
+        answer = template_answer(user_msg, location.get("location_latitude"), location.get("location_longitude"))
+        if answer is not None:
+            return answer
+    except Exception as e:
+        print(f"[Weather] Template failed, asking the LLM: {e}")
+
     system_prompt = get_system_prompt_weather()
     messages = [
         {"role": "system", "content": system_prompt},
@@ -19,9 +33,7 @@ def ask_weather(user_msg: str) -> str:
     ]
     try:
         print("[Weather] Generating response...")
-        response = config.llm.create_chat_completion(
-            messages=messages
-        )
+        response = llm_scheduler.complete("weather", messages=messages)
         raw_text = response["choices"][0]["message"]["content"]
         # Clean the response
         clean_text = re.sub(r"<think>.*?</think>", "", raw_text, flags=re.DOTALL).strip()
@@ -38,35 +50,67 @@ def ask_weather(user_msg: str) -> str:
         raise
 
 class ChatSession:
-    def __init__(self):
-        system_prompt = get_system_prompt_chat()
+    def __init__(self, snapshot: Optional[dict] = None):
         self.llm = config.llm
+        # tokens the llama context held after this session's last generation (prompt cache key)
+        self.state_key = None
+        if snapshot is not None:
+            self.history = snapshot["history"]
+            self.token_counts = snapshot["token_counts"]
+            self.history_tokens = sum(self.token_counts[1:])
+            self.state_key = tuple(snapshot["state_key"]) if snapshot.get("state_key") else None
+            return
+
+        system_prompt = get_system_prompt_chat()
         self.history = [{"role": "system", "content": system_prompt}]
+        # token count per history message (same order), computed once on append
+        self.token_counts = [count_tokens(system_prompt)]
+        self.history_tokens = 0 # running total without the system prompt
+
+    def snapshot(self) -> dict:
+        """JSON-serializable state, see ChatSession(snapshot=...)."""
+        return {
+            "history": self.history,
+            "token_counts": self.token_counts,
+            "state_key": list(self.state_key) if self.state_key else None,
+        }
+
+    def append(self, role: str, content: str) -> int:
+        """
+        Appends a message to the history and returns its token count.
+        """
+        tokens = count_tokens(content)
+        self.history.append({"role": role, "content": content})
+        self.token_counts.append(tokens)
+        self.history_tokens += tokens
+        return tokens
 
     def trim_history(self):
         """
         Ensure history fits within N_CTX by keeping system prompt + the newest messages.
+        Uses the cached per-message counts, so no tokenization happens here.
         """
-        system_prompt = self.history[0]
-        messages = self.history[1:]
-
         # Token budget: leave room for system prompt
-        max_tokens = config.MAX_CONTEXT - count_tokens(system_prompt["content"])
-
-        trimmed = []
-        total_tokens = 0
-        # iterate backwards (newest first)
-        for msg in reversed(messages):
-            msg_tokens = count_tokens(msg["content"])
-            if total_tokens + msg_tokens <= max_tokens:
-                trimmed.insert(0, msg)  # prepend to maintain order
-                total_tokens += msg_tokens
-            else:
-                break
+        max_tokens = config.MAX_CONTEXT - self.token_counts[0]
 
-        self.history = [system_prompt] + trimmed
+        # drop oldest messages until the rest fits
+        drop = 0
+        while self.history_tokens > max_tokens and drop < len(self.token_counts) - 1:
+            drop += 1
+            self.history_tokens -= self.token_counts[drop]
 
-    def ask(self, user_msg: str) -> str:
+        if drop:
+            del self.history[1:drop + 1]
+            del self.token_counts[1:drop + 1]
+
+    def ask(self, user_msg: str, on_token: Optional[Callable[[str, bool], None]] = None,
+            speculative: bool = False) -> str:
+        """
+        Runs one chat turn and returns the pure reply (think block removed).
+        - on_token: optional callback(text, is_think). When set, the reply is streamed and every
+          generated piece is handed over as soon as it exists, already split into think/reply.
+        - speculative: use prompt lookup decoding (copy heavy turns, e.g. with an attachment).
+        """
         print(f"[User] {user_msg}")
 
         time = datetime.now().strftime("%d.%m.%Y, Time: %H:%M")
@@ -81,15 +125,22 @@ class ChatSession:
             tag = "/think" if user_msg.strip().endswith("/think") else "/no think"
             print(f"[Mira] Using {tag}")
 
-            self.history.append({"role": "user", "content": timestamp + "\n" + user_msg + "\n" + tag})
+            user_tokens = self.append("user", timestamp + "\n" + user_msg + "\n" + tag)
 
             # Trim before sending to model
             self.trim_history()
 
             print("[Mira] Generating response...")
-            response = self.llm.create_chat_completion(messages=self.history)
-            reply = response["choices"][0]["message"]["content"]
-            self.history.append({"role": "assistant", "content": reply})
+            # runs on the model thread, streaming or not
+            try:
+                reply = llm_scheduler.run("chat", lambda: self._generate(on_token, speculative))
+            except Exception:
+                # no reply (SchedulerBusy, generation error): take the turn back, or the next request
+                # sends two user turns in a row
+                self.history.pop()
+                self.history_tokens -= self.token_counts.pop()
+                raise
+            reply_tokens = self.append("assistant", reply)
             print(f"[Mira] {reply}")
 
             # log trimmed history (what model saw)
@@ -105,7 +156,7 @@ class ChatSession:
             reply_pure = re.sub(r"<think>.*?</think>", "", reply, flags=re.DOTALL).strip()
 
             # Persist to DB
-            chat_persist_db(self, user_msg, reply_pure, think)
+            chat_persist_db(self, user_msg, reply_pure, think, user_tokens + reply_tokens)
 
             return reply_pure
 
@@ -113,8 +164,99 @@ class ChatSession:
             print(f"[Mira] Error: {e}")
             raise
 
+    def _generate(self, on_token: Optional[Callable[[str, bool], None]], speculative: bool = False) -> str:
+        """
+        Generates the reply for the current history and remembers which tokens the context now holds.
+        """
+        with prompt_lookup(self.llm, speculative):
+            if on_token is None:
+                response = self.llm.create_chat_completion(messages=self.history)
+                reply = response["choices"][0]["message"]["content"]
+            else:
+                reply = self._generate_stream(on_token)
+        self.state_key = tuple(self.llm.input_ids[:self.llm.n_tokens].tolist())
+        return reply
+
+    def _generate_stream(self, on_token: Callable[[str, bool], None]) -> str:
+        """
+        Streams the completion for the current history and returns the raw reply (incl. <think>).
+        Traced as "chat prefill" (until the first piece) and "chat decode".
+        """
+        splitter = ThinkSplitter(on_token)
+        pieces = []
+        start = time.monotonic()
+        first = None
+        stream = self.llm.create_chat_completion(messages=self.history, stream=True)
+        for chunk in stream:
+            piece = chunk["choices"][0]["delta"].get("content")
+            if not piece:
+                continue
+            if first is None:
+                first = time.monotonic()
+            pieces.append(piece)
+            splitter.feed(piece)
+        splitter.flush()
+        if first is not None:
+            tracing.record("chat prefill", start, first)
+            tracing.record("chat decode", first, time.monotonic(), pieces=len(pieces))
+        return "".join(pieces)
 
-def chat_persist_db(self, user_msg, reply, think):
+class ThinkSplitter:
+    """
+    Separates <think>...</think> from the reply while the tokens are still coming in.
+    Tags can arrive split over several pieces, so a possible partial tag is held back until it resolves.
+    Leading whitespace of the reply is dropped (matches the .strip() on the persisted reply).
+    """
+    OPEN = "<think>"
+    CLOSE = "</think>"
+
+    def __init__(self, on_token: Callable[[str, bool], None]):
+        self.on_token = on_token
+        self.buffer = ""
+        self.in_think = False
+        self.reply_started = False
+
+    def feed(self, piece: str):
+        self.buffer += piece
+        while self.buffer:
+            tag = self.CLOSE if self.in_think else self.OPEN
+            idx = self.buffer.find(tag)
+            if idx >= 0:
+                self._emit(self.buffer[:idx])
+                self.buffer = self.buffer[idx + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            # hold back a trailing partial tag ("<thi")
+            keep = _partial_suffix(self.buffer, tag)
+            self._emit(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+
+    def flush(self):
+        self._emit(self.buffer)
+        self.buffer = ""
+
+    def _emit(self, text: str):
+        if not text:
+            return
+        if self.in_think:
+            self.on_token(text, True)
+            return
+        if not self.reply_started:
+            text = text.lstrip()
+            if not text:
+                return
+            self.reply_started = True
+        self.on_token(text, False)
+
+def _partial_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that is a prefix of tag."""
+    for n in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:n]):
+            return n
+    return 0
+
+def chat_persist_db(self, user_msg, reply, think, token_cost):
     """
     Persist chat exchanges into intent_chat table.
 
@@ -122,15 +264,12 @@ def chat_persist_db(self, user_msg, reply, think):
     - self: ChatSession instance
     - user_msg: user's message (str)
     - reply: assistant reply (str)
+    - token_cost: cached token count of the user + assistant history entries (int)
     """
     try:
         # Determine conv_id: use id(self) as a lightweight unique session identifier
         conv_id = id(self)
 
-        # Compute token cost
-        try: token_cost = count_tokens(user_msg + reply)
-        except Exception: token_cost = 0
-
         with write_connection() as conn:
             cur = conn.cursor()
             cur.execute(
@@ -2,33 +2,58 @@
 
 import re
 import json
-from services.prompts_system import get_system_prompt_intent, SYSTEM_PROMPT_WIKIPEDIA, SYSTEM_PROMPT_LISTIFY, SYSTEM_PROMPT_WEB
+from llama_cpp import LlamaGrammar
+from services.prompts_system import get_system_prompt_intent, get_intent_commands, get_intent_list_commands, \
+    SYSTEM_PROMPT_WIKIPEDIA, SYSTEM_PROMPT_LISTIFY, SYSTEM_PROMPT_WEB
 from services.db_access import write_connection
 from services.wikipedia import wikipedia_lucky_search
 from services.url_to_txt import save_url_text, save_multiple_urls_text, trim_output_txt
 from services.web_search import web_search
-import services.config as config
+from services.intent_recall import IntentRecall
+from services.command_matcher import CommandMatcher
+from services.intent_embed import IntentEmbedIndex
+from services import llm_scheduler
 
 def ask_intent(user_msg: str) -> str:
-    system_prompt = get_system_prompt_intent()
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_msg + "\n/no_think"}
-    ]
     print(f"[Intent] User Message: {user_msg}")
+    # Utterances that are exactly one command skip the LLM
+    command = CommandMatcher.match(user_msg)
+    if command is not None:
+        return json.dumps({"intent": "action", "command": command, "matched": user_msg}, ensure_ascii=False)
+    # Repeated commands are answered from intent_action history
+    recalled = IntentRecall.lookup(user_msg)
+    if recalled is not None:
+        print(f"[Intent] Recalled: {recalled}")
+        return recalled
+    # Nearest labelled example (if the embedding classifier is enabled)
+    command = IntentEmbedIndex.classify(user_msg)
+    if command is not None:
+        return json.dumps({"intent": "action", "command": command, "matched": user_msg}, ensure_ascii=False)
+
+    messages = build_intent_messages(user_msg)
     try:
         print("[Intent] Generating response...")
-        response = config.llm.create_chat_completion(messages=messages)
+        response = llm_scheduler.complete("intent", messages=messages, grammar=get_intent_grammar())
         print("[Intent] Response:")
         print(json.dumps(response, indent=2))
-        raw_text = clean_response_text_json(response["choices"][0]["message"]["content"])
+        # grammar guarantees JSONL: {complete object}\n{complete object}\n...
+        raw_text = response["choices"][0]["message"]["content"].strip()
         _persist_db(user_msg, raw_text, raw_text)
+        IntentRecall.learn(user_msg, raw_text)
+        IntentEmbedIndex.learn(user_msg, raw_text)
         print(f"[Intent] Returning: {raw_text}")
         return raw_text
     except Exception as e:
         print(f"[Intent] Error: {e}")
         raise
 
+def build_intent_messages(user_msg: str) -> list[dict]:
+    system_prompt = get_system_prompt_intent()
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_msg + "\n/no_think"}
+    ]
+
 def ask_wikipedia(user_msg: str) -> str:
     system_prompt = SYSTEM_PROMPT_WIKIPEDIA
     messages = [
@@ -38,7 +63,7 @@ def ask_wikipedia(user_msg: str) -> str:
     print(f"[Wikipedia] User Message: {user_msg}")
     try:
         print("[Wikipedia] Generating response...")
-        response = config.llm.create_chat_completion(messages=messages)
+        response = llm_scheduler.complete("wikipedia", messages=messages)
         raw_text = clean_response_text_plain(response["choices"][0]["message"]["content"])
         raw_text = raw_text.replace(" ", "_")
         print(f"[Wikipedia] search key: {raw_text}")
@@ -59,7 +84,7 @@ def ask_web(user_msg: str) -> str:
     print(f"[WEB search] User Message: {user_msg}")
     try:
         print("[WEB search] Generating response...")
-        response = config.llm.create_chat_completion(messages=messages)
+        response = llm_scheduler.complete("web", messages=messages)
         raw_text = clean_response_text_plain(response["choices"][0]["message"]["content"])
         print(f"[WEB search] search key: {raw_text}")
         search = web_search(raw_text)
@@ -70,6 +95,7 @@ def ask_web(user_msg: str) -> str:
         raise
 
 def ask_listify(user_msg: str) -> str:
+    """Fallback for list commands whose intent object came without items."""
     system_prompt = SYSTEM_PROMPT_LISTIFY
     messages = [
         {"role": "system", "content": system_prompt},
@@ -78,7 +104,7 @@ def ask_listify(user_msg: str) -> str:
     print(f"[Listify] User Message: {user_msg}")
     try:
         print("[Listify] Generating response...")
-        response = config.llm.create_chat_completion(messages=messages)
+        response = llm_scheduler.complete("listify", messages=messages)
         raw_text = clean_response_text_plain(response["choices"][0]["message"]["content"])
         print(f"[Listify] Result: {raw_text}")
         return raw_text
@@ -86,28 +112,58 @@ def ask_listify(user_msg: str) -> str:
         print(f"[Error] {e}")
         raise
 
-def clean_response_text_json(text: str) -> str:
-    """Cleaner for intent responses (expects JSON or JSONL)."""
-    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
-    stripped = text.strip()
-    try:
-        obj = json.loads(stripped)
-        return json.dumps(obj, ensure_ascii=False)
-    except Exception:
-        lines = [line.strip() for line in stripped.splitlines() if line.strip()]
-        compact_lines = []
-        buffer = []
-        for line in lines:
-            buffer.append(line)
-            if line.endswith("}"):
-                try:
-                    obj = json.loads("\n".join(buffer))
-                    compact_lines.append(json.dumps(obj, ensure_ascii=False))
-                    buffer = []
-                except Exception:
-                    pass
-        return "\n".join(compact_lines)
+########################################################################################
+"""############################     Intent grammar     ##############################"""
+########################################################################################
+# Compiled grammar for the current command set, rebuilt only when the command set changes.
+_intent_grammar = {"commands": None, "grammar": None}
+INTENT_MAX_OBJECTS = 8
+
+def get_intent_grammar() -> LlamaGrammar:
+    """
+    GBNF that only admits valid {intent, command, matched} objects, one per line.
+    Action commands are restricted to the live command set; generation ends after the last object.
+    List commands additionally carry "items", so one generation both classifies and extracts.
+    """
+    commands = (tuple(get_intent_commands()), tuple(get_intent_list_commands()))
+    if _intent_grammar["commands"] != commands:
+        _intent_grammar["grammar"] = LlamaGrammar.from_string(build_intent_gbnf(*commands), verbose=False)
+        _intent_grammar["commands"] = commands
+        print(f"[Intent] Grammar rebuilt for {len(commands[0])} commands.")
+    return _intent_grammar["grammar"]
+
+def build_intent_gbnf(commands, list_commands=()) -> str:
+    list_commands = [c for c in commands if c in list_commands]
+    commands = [c for c in commands if c not in list_commands]
+    objects = ["chat"]
+    rules = [
+        'chat ::= "{\\"intent\\": \\"chat\\", \\"command\\": \\"Pass to Mira.\\", \\"matched\\": " string "}"',
+        'string ::= "\\"" char* "\\""',
+        'char ::= [^"\\\\\\x7F\\x00-\\x1F] | "\\\\" (["\\\\/bfnrt] | "u" [0-9a-fA-F]{4})',
+    ]
+    if commands:
+        objects.insert(0, "action")
+        command_rule = " | ".join(_gbnf_literal(json.dumps(c, ensure_ascii=False)) for c in commands)
+        rules += [
+            'action ::= "{\\"intent\\": \\"action\\", \\"command\\": " command ", \\"matched\\": " string "}"',
+            f'command ::= {command_rule}',
+        ]
+    if list_commands:
+        objects.insert(-1, "list-action")
+        list_command_rule = " | ".join(_gbnf_literal(json.dumps(c, ensure_ascii=False)) for c in list_commands)
+        rules += [
+            'list-action ::= "{\\"intent\\": \\"action\\", \\"command\\": " list-command ", \\"matched\\": " string '
+            '", \\"items\\": " items "}"',
+            f'list-command ::= {list_command_rule}',
+            'items ::= "[" (string (", " string)*)? "]"',
+        ]
+    return "\n".join([
+        f'root ::= object ("\\n" object){{0,{INTENT_MAX_OBJECTS - 1}}}',
+        f'object ::= {" | ".join(objects)}',
+    ] + rules)
 
+def _gbnf_literal(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
 
 def clean_response_text_plain(text: str) -> str:
     """Cleaner for wikipedia/web/listify responses (expects plain text)."""
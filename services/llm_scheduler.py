@@ -0,0 +1,149 @@
+# services.llm_scheduler.py
+
+import contextvars
+import itertools
+import queue
+import threading
+import time
+from typing import Callable, Any
+import services.config as config
+from services import tracing
+
+"""
+config.llm is a single llama.cpp context, but message pipelines (one per client message) and the API routes
+arrive on two threaded Werkzeug servers. All inference goes through one worker thread that owns the model:
+    - Jobs are queued by priority: short intent/listify ahead of keygen/weather ahead of chat generations.
+    - A job that isn't started within QUEUE_TIMEOUT is dropped and the caller gets SchedulerBusy.
+    - Beyond MAX_QUEUE_DEPTH waiting jobs new work is rejected right away instead of stalling every thread.
+    - Jobs run in the caller's context, so their queue wait and inference land in the caller's trace
+      (services/tracing.py) as "llm <task> queue" and "llm <task>".
+    - With a utility model loaded (config.init_qwen_utility) tasks routed to it by config.LLM_ROUTES run on
+      their own worker, so an intent pass doesn't wait behind a chat generation.
+"""
+TASK_PRIORITY = {
+    "intent": 0,
+    "listify": 0,
+    "wikipedia": 1,
+    "web": 1,
+    "weather": 1,
+    "chat": 2,
+}
+MAX_QUEUE_DEPTH = 8
+QUEUE_TIMEOUT = 120 # seconds
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a job is rejected (queue full) or deferred too long."""
+
+class _Job:
+    def __init__(self, fn: Callable[[], Any], task: str):
+        self.fn = fn
+        self.task = task
+        self.enqueued = time.monotonic()
+        self.context = contextvars.copy_context()
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+class InferenceScheduler:
+    def __init__(self, name: str, max_depth: int = MAX_QUEUE_DEPTH, queue_timeout: float = QUEUE_TIMEOUT):
+        self.name = name
+        self.max_depth = max_depth
+        self.queue_timeout = queue_timeout
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._worker = None
+        self.waiting = 0 # live queued jobs; cancelled ones stay in _queue until the worker pops them
+        self.running = None
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, task: str, fn: Callable[[], Any]) -> Any:
+        """
+        Runs fn on the model thread and blocks until it finished. Returns fn's result or re-raises its error.
+        """
+        # nested call from inside a running job: already on the model thread
+        if threading.current_thread() is self._worker:
+            return fn()
+
+        job = _Job(fn, task)
+        with self._lock:
+            self._ensure_worker()
+            if self.waiting >= self.max_depth:
+                self.rejected += 1
+                print(f"[Scheduler] {self.name}: queue full ({self.waiting}), rejected {task}.")
+                raise SchedulerBusy(f"Model is busy ({self.waiting} requests waiting).")
+            self._queue.put((TASK_PRIORITY.get(task, 1), next(self._seq), job))
+            self.waiting += 1
+            depth = self.waiting
+        if depth > 1 or self.running:
+            print(f"[Scheduler] {self.name}: queued {task} (depth {depth}, running {self.running})")
+
+        if not job.started.wait(self.queue_timeout):
+            with self._lock:
+                # the worker may have picked it up in the meantime
+                if not job.started.is_set():
+                    job.cancelled = True
+                    self.waiting -= 1
+            if job.cancelled:
+                self.rejected += 1
+                print(f"[Scheduler] {self.name}: {task} waited {self.queue_timeout}s, deferred.")
+                raise SchedulerBusy("Model is busy, request timed out in queue.")
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "queued": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=f"llm-{self.name}", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                if job.cancelled:
+                    continue
+                self.waiting -= 1
+                job.started.set()
+                self.running = job.task
+            started = time.monotonic()
+            try:
+                job.result = job.context.run(job.fn)
+            except BaseException as e:
+                job.error = e
+            finally:
+                finished = time.monotonic()
+                job.context.run(tracing.record, f"llm {job.task} queue", job.enqueued, started)
+                job.context.run(tracing.record, f"llm {job.task}", started, finished, model=self.name)
+                self.running = None
+                self.completed += 1
+                job.done.set()
+
+scheduler = InferenceScheduler("main")
+utility_scheduler = InferenceScheduler("utility")
+
+def run(task: str, fn: Callable[[], Any]) -> Any:
+    """Runs fn (which uses config.llm) on the main model thread."""
+    return scheduler.submit(task, fn)
+
+def complete(task: str, **kwargs) -> dict:
+    """Scheduled create_chat_completion (non-streaming) on the model config.LLM_ROUTES picks for task."""
+    route = config.route_model(task)
+    target = utility_scheduler if route == "utility" else scheduler
+    return target.submit(task, lambda: config.get_model(route).create_chat_completion(**kwargs))
+
+def stats() -> dict:
+    return {"main": scheduler.stats(), "utility": utility_scheduler.stats()}
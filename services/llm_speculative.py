@@ -0,0 +1,73 @@
+# services.llm_speculative.py
+
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import services.config as config
+
+"""
+Prompt lookup decoding: drafts the next tokens from n-grams that already occur in the prompt and lets the
+model verify several of them in one forward pass. Answers that copy spans from an attachment
+("summarize this", "quote the part about X") decode multiple tokens per pass on CPU.
+    - Enable with config.SPECULATIVE_LOOKUP (needs logits_all, see config.py).
+    - ChatSession.ask(..., speculative=True) turns it on for a single call; services/pipeline.py does so for attachments.
+    - Run this module for a tokens/sec comparison on temp/output.txt:
+        python -m services.llm_speculative [attachment.txt]
+"""
+
+@contextmanager
+def prompt_lookup(llm, enabled: bool = True):
+    """
+    Attaches the prompt lookup draft model to llm for the duration of the block (model thread only).
+    No-op if speculative decoding isn't configured.
+    """
+    if not enabled or config.prompt_lookup is None:
+        yield
+        return
+    llm.draft_model = config.prompt_lookup
+    try:
+        yield
+    finally:
+        llm.draft_model = None
+
+########################################################################################
+"""############################       Benchmark        ##############################"""
+########################################################################################
+BENCH_QUESTIONS = [
+    "Summarize this.",
+    "Quote the first two sentences word for word.",
+]
+BENCH_RUNS = 3
+
+def _bench_once(messages, speculative: bool) -> float:
+    with prompt_lookup(config.llm, speculative):
+        start = time.perf_counter()
+        response = config.llm.create_chat_completion(messages=messages, temperature=0.0, max_tokens=256)
+        elapsed = time.perf_counter() - start
+    return response["usage"]["completion_tokens"] / elapsed
+
+def benchmark(attachment_path):
+    from services.prompts_system import get_system_prompt_chat
+
+    context = attachment_path.read_text(encoding="utf-8")
+    system_prompt = get_system_prompt_chat()
+    for question in BENCH_QUESTIONS:
+        # same input as the pipeline's attachment path
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": context + "\n\n" + question + "\n/no think"},
+        ]
+        _bench_once(messages, False) # warm up: prefill once, later runs reuse the prefix
+        for speculative in (False, True):
+            rates = [_bench_once(messages, speculative) for _ in range(BENCH_RUNS)]
+            label = "prompt lookup" if speculative else "baseline"
+            print(f"[Bench] {question!r} {label:>13}: {sum(rates) / len(rates):6.2f} tokens/s "
+                  f"(min {min(rates):.2f}, max {max(rates):.2f})")
+
+if __name__ == "__main__":
+    config.SPECULATIVE_LOOKUP = True
+    config.init_qwen()
+    config.llm.set_cache(None) # measure decoding, not cache restores
+    path = config.BASE_PATH / "temp" / "output.txt" if len(sys.argv) < 2 else Path(sys.argv[1])
+    benchmark(path)
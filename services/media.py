@@ -8,6 +8,7 @@ import urllib.parse
 from pathlib import Path
 from services import config as g
 from services.config import BASE_PATH
+from services.command_registry import CommandRegistry
 
 # Determine if we're running in Docker
 IN_DOCKER = os.getenv("IN_DOCKER", "").lower() == "true"
@@ -131,6 +132,17 @@ def media_previous() -> None:
     """
     vlc_request("/requests/status.json", {"command": "pl_previous"})
 
+CommandRegistry.register("media", {
+    "play music": lambda call: media_play(),
+    "play media": lambda call: media_play(),
+    "next song": lambda call: media_next(),
+    "next episode": lambda call: media_next(),
+    "previous song": lambda call: media_previous(),
+    "previous episode": lambda call: media_previous(),
+    "pause playback": lambda call: media_pause(),
+}, prompt=["play music or play media", "next song or next episode", "previous song or previous episode",
+           "pause playback"])
+
 def playlist_load(command: str) -> str:
     """
     Load a playlist by name from command string.
@@ -253,4 +265,6 @@ def discover_playlists() -> None:
     g.PLAYLIST_FILENAMES.clear()
     g.PLAYLIST_FILENAMES.update(stem_to_filename)
 
-    print(f"[Media] Discovered {len(stem_list)} playlists: {stem_list}")
\ No newline at end of file
+    print(f"[Media] Discovered {len(stem_list)} playlists: {stem_list}")
+    CommandRegistry.register("playlists", {f"play {stem}": lambda call: playlist_load(call.command)
+                                           for stem in stem_list})
\ No newline at end of file
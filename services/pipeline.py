@@ -0,0 +1,185 @@
+# services.pipeline.py
+
+import json
+from typing import Callable, Optional
+from services.config import BASE_PATH, HasAttachment
+from services.llm_intent import ask_intent, ask_wikipedia, ask_web
+from services.llm_chat import ask_weather
+from services.llm_vl import image_inference
+from services.llm_scheduler import SchedulerBusy
+from services import action_pool, tracing
+from services.chat_sessions import ChatRegistry
+from services import tts
+from services.tts import TTSWorker, split_into_chunks, clean_voice_chunks
+
+"""
+One server-side flow per user message (Socket.IO 'user_message'): hardcode detection, intent classification,
+action dispatch and chat. Replaces the /hardcode -> /intent -> /chat round trips; the message state lives
+in the MessagePipeline instance instead of the global ChatState, so two clients can talk at once.
+
+Intent data structure: {"intent": "chat", "command": "Pass to Mira.", "matched": user_msg}
+    - Intent can be action/chat.
+    - Commands are in services/command_library.py and the intent prompt in services/prompts_system.py
+    - user_msg is split by the LLM (intent pass) and set as matched field in each of n json objects
+      {complete object}\n{complete object}\n...
+
+Events pushed to the asking client as they complete:
+    - pipeline_action {reply, ok}         one per action as it completes (services/action_pool.py),
+                                          or why the intent pass failed
+    - chat_token      {token, think}      streamed chat reply
+    - pipeline_reply  {reply}             final reply text
+    - voice_segment   {timestamp, seq, sample_rate, pcm, last}
+                                          streamed speech (tts.TTS_STREAMING): 16-bit mono PCM pieces in order
+    - voice_ready     {timestamp, count}  without streaming: static/temp/output_<i>_<timestamp>.wav, i = 1..count
+    - pipeline_done   {request_id}        always last
+
+Every message is traced (services/tracing.py): hardcode, intent, actions, LLM queue/inference, chat and TTS spans.
+"""
+Emit = Callable[[str, dict], None]
+
+class MessagePipeline:
+    def __init__(self, user_msg: str, chat_id: str, emit: Emit, broadcast: Emit, request_id: str = None):
+        self.user_msg = user_msg
+        self.chat_id = chat_id
+        self.emit = emit            # to the asking client
+        self.broadcast = broadcast  # to every client (attachment state)
+        self.actions = []           # futures of the dispatched actions
+        self.request_id = request_id # from /upload_audio when the message was spoken
+
+    def run(self):
+        trace = tracing.start("message", self.request_id, chars=len(self.user_msg))
+        try:
+            with tracing.span("hardcode"):
+                chat_msg = self._hardcode()
+            if chat_msg is None:
+                chat_msg = self._intent()
+            if chat_msg is not None:
+                with tracing.span("chat"):
+                    reply = self._chat(chat_msg)
+                self._reply(reply)
+        except Exception as e:
+            print(f"[Pipeline] Error: {e}")
+            self.emit("pipeline_reply", {"reply": "Sorry, something went wrong."})
+        finally:
+            action_pool.wait_all(self.actions)
+            self.emit("pipeline_done", {"request_id": trace.request_id if trace else None})
+            tracing.finish(trace)
+
+    def _hardcode(self) -> Optional[str]:
+        """Wikipedia/web search: fetch into the attachment and chat about it (no intent pass)."""
+        user_msg = self.user_msg
+        if "wikipedia" in user_msg:
+            ask_wikipedia(user_msg)
+            print("[Hardcode] Detected wikipedia")
+        elif "web" in user_msg and "search" in user_msg:
+            ask_web(user_msg)
+            print("[Hardcode] Detected web search")
+        else:
+            return None
+        HasAttachment.set_attachment(True)
+        return user_msg
+
+    def _intent(self) -> Optional[str]:
+        """
+        Dispatches the action objects. Returns the text for the chat pass or None if there's nothing to chat.
+        """
+        try:
+            with tracing.span("intent"):
+                raw_intent = ask_intent(self.user_msg)
+        except SchedulerBusy as e:
+            print(f"[Intent] {e}")
+            self.emit("pipeline_action", {"reply": f"Invalid intent response: {e}", "ok": False})
+            return None
+
+        chat_msg = None
+        # one object per line (grammar constrained, see services/llm_intent.py)
+        for line in raw_intent.strip().splitlines():
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError:
+                self.emit("pipeline_action", {"reply": "Invalid intent response: not a valid JSON", "ok": False})
+                return None
+            command = obj.get("command", "")
+            if obj.get("intent") == "action":
+                if command == "get weather":
+                    # voice out but not chat, so weather context doesn't taint the chat session
+                    with tracing.span("weather"):
+                        weather = ask_weather(self.user_msg)
+                    print(f"[Intent] Determined weather: {weather}")
+                    self._reply(weather)
+                    return None
+                print(f"[Intent] Determined action: {command}")
+                self.actions.append(action_pool.dispatch(
+                    command, self.user_msg, self.chat_id, obj.get("items"), self._action_done))
+            elif obj.get("intent") == "chat":
+                print("[Intent] Determined chat intent.")
+                chat_msg = obj.get("matched") or self.user_msg
+        return chat_msg
+
+    def _action_done(self, command: str, status: str):
+        if status == "ok":
+            self.emit("pipeline_action", {"reply": f"Handled action: {command}", "ok": True})
+        elif status == "invalid":
+            print(f"[Intent] Ignored invalid command: {command}")
+        elif status == "timeout":
+            self.emit("pipeline_action", {"reply": f"Action timed out: {command}", "ok": False})
+        else:
+            self.emit("pipeline_action", {"reply": f"Action failed: {command}", "ok": False})
+
+    def _chat(self, user_msg: str) -> str:
+        has_attachment, is_picture = HasAttachment.consume()
+        try:
+            # Channel to VL if an image is attached
+            # Small and probably even big VL models suck at longer text context
+            if has_attachment and is_picture:
+                print(f"[VL] Reading attachment...")
+                reply = image_inference(BASE_PATH / "temp" / "picture.jpeg", user_msg)
+                self.broadcast("attachment_update", {"has_attachment": False, "type": "consumed"})
+                return reply
+
+            # Channel to txt model if we've converted an allowed input into .txt
+            speculative = False
+            if has_attachment:
+                try:
+                    context = (BASE_PATH / "temp" / "output.txt").read_text(encoding="utf-8")
+                    user_msg = context + "\n\n" + user_msg
+                except Exception as e:
+                    print(f"[Chat] Failed to read attachment: {e}")
+                self.broadcast("attachment_update", {"has_attachment": False, "type": "consumed"})
+                # answers tend to copy from the attachment: draft from prompt n-grams
+                speculative = True
+
+            def on_token(token, is_think):
+                self.emit("chat_token", {"token": token, "think": is_think})
+            return ChatRegistry.get(self.chat_id).ask(user_msg, on_token=on_token, speculative=speculative)
+
+        except SchedulerBusy as e:
+            print(f"[Chat] {e}")
+            return "I'm busy with other requests right now. Please ask again in a moment."
+        except Exception as e:
+            print(f"[Chat] Error: {e}")
+            return "Error processing message."
+
+    def _reply(self, reply: str):
+        self.emit("pipeline_reply", {"reply": reply})
+        if not reply:
+            return
+        if tts.TTS_STREAMING:
+            # audio is pushed as XTTS produces it, the client queues it (voice_segment)
+            timestamp, _ = split_into_chunks(reply)
+            def on_audio(seq, pcm, last):
+                self.emit("voice_segment", {"timestamp": timestamp, "seq": seq, "sample_rate": tts.SAMPLE_RATE,
+                                            "pcm": pcm, "last": last})
+            TTSWorker.submit(reply, timestamp, self._request_id(), owner=self.chat_id, on_audio=on_audio)
+            return
+        # start synthesis right away, the client plays the chunks as they appear
+        clean_voice_chunks()
+        timestamp, chunks = split_into_chunks(reply)
+        TTSWorker.submit(reply, timestamp, self._request_id(), owner=self.chat_id)
+        self.emit("voice_ready", {"timestamp": timestamp, "count": len(chunks)})
+
+    def _request_id(self) -> str:
+        trace = tracing.current()
+        return trace.request_id if trace is not None else self.request_id
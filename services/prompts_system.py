@@ -1,20 +1,71 @@
 # services.prompts_system.py
 
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
+from typing import Callable, Hashable
 
-from services.config import PLAYLIST_STEM, BASE_PATH, PLUGS
-from services.db_get import GetDB
-from services.weather import get_weather
+from services.config import BASE_PATH
+from services.command_registry import CommandRegistry
+from services.db_get import GetDB, get_settings
+from services.weather import get_weather_forecast
 
 logs = BASE_PATH / "logs"
 log_chat_prompt = logs / "prompt_chat.log"
 log_weather_prompt = logs / "prompt_weather.log"
 log_intent_prompt = logs / "prompt_intent.log"
 
+########################################################################################
+"""#############################     Prompt cache      ##############################"""
+########################################################################################
+class SystemPrompts:
+    """
+    Built system prompts, reused while their key holds: the same text every call, so llama.cpp's prefix
+    matching (and the prompt cache) hits.
+        - chat: settings (invalidated on /api/settings POST) and the day (schedule rollover)
+        - intent: the command registry version (plugs, playlist rediscovery)
+    The prompt logs are only rewritten when the text changed.
+    """
+    _lock = threading.Lock()
+    _cache = {}   # name -> (key, prompt)
+    _logged = {}  # log path -> last written prompt
+
+    @classmethod
+    def get(cls, name: str, key: Hashable, build: Callable[[], str]) -> str:
+        with cls._lock:
+            cached = cls._cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        prompt = build()
+        with cls._lock:
+            cls._cache[name] = (key, prompt)
+        return prompt
+
+    @classmethod
+    def invalidate(cls, name: str = None):
+        """Drops one (or every) cached prompt; the next call rebuilds it."""
+        with cls._lock:
+            if name is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(name, None)
+        print(f"[Prompts] Invalidated {name or 'all'}.")
+
+    @classmethod
+    def log(cls, path, prompt: str):
+        with cls._lock:
+            if cls._logged.get(path) == prompt:
+                return
+            cls._logged[path] = prompt
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(prompt)
+
 ########################################################################################
 """#############################       Mira chat       ##############################"""
 ########################################################################################
 def get_system_prompt_chat():
+    return SystemPrompts.get("chat", datetime.now().date(), _build_system_prompt_chat)
+
+def _build_system_prompt_chat():
     persona = """You are Mira, a charismatic assistant.
 1. You are a helpful, knowledgeable conversational partner.
 2. Voice: curious, witty, warm.
@@ -24,12 +75,13 @@ def get_system_prompt_chat():
 6. Emit plain text optimized for TTS: No markup, no emoji, no special characters. Use natural, conversational phrasing and clear punctuation. Avoid parentheses, bullet characters, and inline code.
 7. When a new conversation starts, greet by name and reference the schedule if relevant. Use the available information about the user to personalize greetings. Use the user profile sparingly so task context remains primary. When the schedule is undefined: Assume free-time. 7.4 Assume free-time on weekends."""
 
-    # get dynamic stuff for the user block and format
-    user = GetDB.get_user_name()
-    bday = _bulletin(GetDB.get_user_birthday())
+    # get dynamic stuff for the user block and format (one settings query)
+    settings = get_settings()
+    user = settings.get("user_name")
+    bday = _bulletin(settings.get("user_birthday") or "")
     weekday = datetime.now().strftime("%A")
-    schedule = _reverse_lines(_indent(_bulletin(GetDB.get_schedule(weekday)), 2))
-    additional_info = _indent(_bulletin(GetDB.get_additional_info()), 1)
+    schedule = _reverse_lines(_indent(_bulletin(settings.get(f"schedule_{weekday.lower()}") or ""), 2))
+    additional_info = _indent(_bulletin(settings.get("additional_info") or ""), 1)
 
     user_info = _indent(f"""- The users name is {user}.
     - Born on {bday}.
@@ -41,14 +93,28 @@ def get_system_prompt_chat():
     #time_info = _indent(f"""- It is {timestamp}""", 1)
 
     system_prompt = f"{persona}\n{user_info}" #\n{time_info}
-    with open(log_chat_prompt, "w", encoding="utf-8") as f:
-        f.write(system_prompt)
+    SystemPrompts.log(log_chat_prompt, system_prompt)
     return system_prompt
 
 ########################################################################################
 """#############################        Intent         ##############################"""
 ########################################################################################
+# Commands come from services/command_registry.py; the prompt is rebuilt only when the registry changes.
+
+def get_intent_commands() -> list[str]:
+    """
+    The live command set: every command the modules registered (static, smart plugs, playlists).
+    """
+    return list(CommandRegistry.commands())
+
+def get_intent_list_commands() -> list[str]:
+    """Commands whose intent object carries the extracted items."""
+    return list(CommandRegistry.item_commands())
+
 def get_system_prompt_intent():
+    return SystemPrompts.get("intent", CommandRegistry.version, _build_system_prompt_intent)
+
+def _build_system_prompt_intent():
     persona = """Your task is to determine the intent of the user message.
     - You must output valid json objects for every command in the user message.
     - Do not emit (meta) commentary or reasoning.
@@ -58,29 +124,14 @@ def get_system_prompt_intent():
     - If there is no match in **possible commands**: Intent is always chat.
     - If the intent is chat: The command is always: Pass to Mira.
     - If the user message is not fully matched through commands: Add an intent is chat json."""
+    item_commands = get_intent_list_commands()
+    if item_commands:
+        persona += f"\n    - {', '.join(item_commands)} have a fourth field, items: the list of requested items."
+
+    possible_commands = "\t- The **possible commands** are:\n" + _indent(_bulletin("\n".join(CommandRegistry.prompt_lines())), 2)
 
-    possible_commands = """\t- The **possible commands** are:
-        - new chat or new conversation
-        - play music or play media
-        - next song or next episode
-        - previous song or previous episode
-        - pause playback
-        - remove attachment
-        - new ShoppingList or append ShoppingList
-        - new ToDoList or append ToDoList
-        - get weather"""
-
-    smart_plugs_str = "\n".join(
-        f"on {name.capitalize()}\noff {name.capitalize()}" for name in PLUGS
-    )
-    smart_plugs = _bulletin(_indent(smart_plugs_str, 2))
-
-    by_stem_str = "\n".join(f"play {stem}" for stem in PLAYLIST_STEM)
-    playlists = _bulletin(_indent(by_stem_str, 2))
-
-    system_prompt = f"{persona}\n{possible_commands}\n{smart_plugs}\n{playlists}"
-    with open(log_intent_prompt, "w", encoding="utf-8") as f:
-        f.write(system_prompt)
+    system_prompt = f"{persona}\n{possible_commands}"
+    SystemPrompts.log(log_intent_prompt, system_prompt)
     return system_prompt
 
 ########################################################################################
@@ -113,6 +164,7 @@ def get_system_prompt_weather():
         - 41 to 60 = Strong wind
         - 61 to 90 = Very strong wind
         - 91 and beyond = Storm / severe wind
+    - Forecast lines are per period of the day: temperature range, the hours with precipitation or snowfall and their peak hourly amount, the strongest wind.
     If precipitation, snow, etc. are not listed they are 0.\n"""
 
     # get location, weather data and format
@@ -122,20 +174,14 @@ def get_system_prompt_weather():
 
     lat = location_data.get("location_latitude")
     lon = location_data.get("location_longitude")
-    weather_reports = []
-    for i in range(3): # 3 seems to suit my needs and not blow context. 7 would be nice to include the next weekend.
-        day = datetime.now() + timedelta(days=i)
-        formatted_day = day.strftime("%Y-%m-%d")
-        report = get_weather(lat, lon, date=formatted_day, debug=False)
-        weather_reports.append(report)
-    weather_text = "\n\n".join(f"{report}" for report in weather_reports)
+    # 3 days seems to suit my needs and not blow context. 7 would be nice to include the next weekend.
+    weather_text = get_weather_forecast(lat, lon, days=3, debug=False)
     weather_block = _indent(weather_text, 1)
 
     today = f"- **Today is {datetime.now().strftime('%d.%m.%Y')}**"
 
     system_prompt = f"{system}\n{location}\n{weather_block}\n\n{today}"
-    with open(log_weather_prompt, "w", encoding="utf-8") as f:
-        f.write(system_prompt)
+    SystemPrompts.log(log_weather_prompt, system_prompt)
     return system_prompt
 
 ########################################################################################
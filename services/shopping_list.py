@@ -2,6 +2,7 @@
 
 import json
 from services.config import BASE_PATH
+from services.command_registry import CommandRegistry
 
 shopping_list_path = BASE_PATH / "static" / "lists" / "shopping_list.json"
 
@@ -54,3 +55,8 @@ def append_shopping_list(new_items):
         json.dump(updated_list, f, indent=2, ensure_ascii=False)
 
     return updated_list
+
+CommandRegistry.register("shopping_list", {
+    "new ShoppingList": lambda call: new_shopping_list(call.items),
+    "append ShoppingList": lambda call: append_shopping_list(call.items),
+}, prompt=["new ShoppingList or append ShoppingList"], items=True)
@@ -3,6 +3,9 @@
 import requests
 from services.db_get import GetDB
 from services.config import PLUGS
+from services.command_registry import CommandRegistry
+
+PLUG_TIMEOUT = 3 # seconds; an offline plug must not hold up the action pool
 
 def load_plugs_from_db():
     """
@@ -19,6 +22,12 @@ def load_plugs_from_db():
         if name:
             PLUGS[name.lower()] = ip or None
 
+    handlers = {}
+    for name in PLUGS:
+        handlers[f"on {name.capitalize()}"] = lambda call, plug=name: turn_on(plug)
+        handlers[f"off {name.capitalize()}"] = lambda call, plug=name: turn_off(plug)
+    CommandRegistry.register("smart_plugs", handlers)
+
 def _send_command(name: str, action: str):
     """Internal helper."""
     ip = PLUGS.get(name.lower())
@@ -28,7 +37,7 @@ def _send_command(name: str, action: str):
 
     url = f"http://{ip}/cm?cmnd=Power%20{action.capitalize()}"
     try:
-        requests.get(url)
+        requests.get(url, timeout=PLUG_TIMEOUT)
     except Exception as e:
         print(f"[SmartPlug] Error sending command to '{name}': {e}")
 
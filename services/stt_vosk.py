@@ -9,6 +9,7 @@ import subprocess
 import tempfile
 import shutil
 from services.config import BASE_PATH
+from services import tracing
 
 # Define model path and sample rate
 vosk_model_path = BASE_PATH / "static" / "vosk-model-en-us-0.42-gigaspeech"
@@ -85,7 +86,8 @@ def transcribe_audio(audio_path, wake_word="please"):
     Turns voice-in into text and prepends the wake word.
     """
     print(f"[STT@Vosk] Prepending wake word '{wake_word}' to: {audio_path}")
-    audio_path, temp_dir, wake_info = prepend_wake_audio(audio_path, wake_word)
+    with tracing.span("stt wake prepend"):
+        audio_path, temp_dir, wake_info = prepend_wake_audio(audio_path, wake_word)
 
     try:
         wf = wave.open(str(audio_path), "rb")
@@ -98,18 +100,19 @@ def transcribe_audio(audio_path, wake_word="please"):
         segments = []
         start_time = time.time()
 
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                if "result" in result:
-                    segments.extend(result["result"])
-
-        final_result = json.loads(rec.FinalResult())
-        if "result" in final_result:
-            segments.extend(final_result["result"])
+        with tracing.span("stt vosk decode", audio_s=round(wf.getnframes() / sample_rate, 2)):
+            while True:
+                data = wf.readframes(4000)
+                if len(data) == 0:
+                    break
+                if rec.AcceptWaveform(data):
+                    result = json.loads(rec.Result())
+                    if "result" in result:
+                        segments.extend(result["result"])
+
+            final_result = json.loads(rec.FinalResult())
+            if "result" in final_result:
+                segments.extend(final_result["result"])
 
         full_text = final_result.get("text", "").strip()
         duration = time.time() - start_time
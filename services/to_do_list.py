@@ -2,6 +2,7 @@
 
 import json
 from services.config import BASE_PATH
+from services.command_registry import CommandRegistry
 
 to_do_list_path = BASE_PATH / "static" / "lists" / "to_do_list.json"
 
@@ -54,3 +55,8 @@ def append_to_do_list(new_items):
         json.dump(updated_list, f, indent=2, ensure_ascii=False)
 
     return updated_list
+
+CommandRegistry.register("to_do_list", {
+    "new ToDoList": lambda call: new_to_do_list(call.items),
+    "append ToDoList": lambda call: append_to_do_list(call.items),
+}, prompt=["new ToDoList or append ToDoList"], items=True)
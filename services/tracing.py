@@ -0,0 +1,178 @@
+# services.tracing.py
+
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+from services.config import BASE_PATH
+
+"""
+Per-request tracing: every user message (and every voice upload) gets a request id and a list of timed spans.
+    trace = tracing.start("message", text=user_msg)
+    with tracing.span("intent"):
+        ...
+    tracing.finish(trace)
+    - The trace is found through a context variable: spans anywhere below (llm_scheduler, tts, stt_vosk) land
+      in it without passing it around. Work on other threads carries it along: the scheduler runs jobs in the
+      caller's context, action workers and the voice thread use fork() + attached().
+    - A trace is written when its owner finished and every fork was released (TTS outlives the pipeline).
+    - Finished traces go to logs/traces.log (JSON lines, rotating) and the last RECENT_TRACES are kept for
+      /api/traces, which also reports p50/p95 per span name.
+"""
+TRACING_ENABLED = True
+TRACE_LOG = BASE_PATH / "logs" / "traces.log"
+TRACE_LOG_BYTES = 5 * 1024 * 1024
+TRACE_LOG_BACKUPS = 3
+RECENT_TRACES = 200
+
+class Trace:
+    def __init__(self, kind: str, request_id: str = None, **attrs):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.attrs = attrs
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.t0 = time.monotonic()
+        self.total_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+        self._holds = 1 # the owner
+
+    def record(self, name: str, start: float, end: float, **attrs):
+        """Adds a span from two time.monotonic() readings."""
+        span = {"name": name, "start_ms": round((start - self.t0) * 1000, 1), "ms": round((end - start) * 1000, 1)}
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def fork(self) -> "Trace":
+        """Keeps the trace open for work on another thread; that thread releases it (attached)."""
+        with self._lock:
+            self._holds += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._holds -= 1
+            if self._holds > 0:
+                return
+            self.total_ms = round((time.monotonic() - self.t0) * 1000, 1)
+        Traces.write(self)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {"request_id": self.request_id, "kind": self.kind, "started_at": self.started_at,
+                "total_ms": self.total_ms, **self.attrs, "spans": spans}
+
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+def start(kind: str, request_id: str = None, **attrs) -> Optional[Trace]:
+    """Starts a trace and makes it current for this thread. None if tracing is off."""
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(kind, request_id, **attrs)
+    _current.set(trace)
+    return trace
+
+def finish(trace: Optional[Trace]):
+    """Releases the owner's hold; the trace is written once the forks are released too."""
+    if trace is not None:
+        _current.set(None)
+        trace.release()
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+def fork() -> Optional[Trace]:
+    trace = _current.get()
+    return trace.fork() if trace is not None else None
+
+@contextmanager
+def attached(trace: Optional[Trace]):
+    """Makes a forked trace current on this thread and releases it afterwards."""
+    if trace is None:
+        yield
+        return
+    token = _current.set(trace)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+        trace.release()
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the block into the current trace. Yields the attrs dict, so the block can add to it."""
+    trace = _current.get()
+    start_time = time.monotonic()
+    try:
+        yield attrs
+    finally:
+        if trace is not None:
+            trace.record(name, start_time, time.monotonic(), **attrs)
+
+def record(name: str, start_time: float, end_time: float, **attrs):
+    trace = _current.get()
+    if trace is not None:
+        trace.record(name, start_time, end_time, **attrs)
+
+class Traces:
+    _lock = threading.Lock()
+    _recent = deque(maxlen=RECENT_TRACES)
+    _logger = None
+
+    @classmethod
+    def write(cls, trace: Trace):
+        data = trace.to_dict()
+        with cls._lock:
+            cls._recent.append(data)
+            try:
+                cls._get_logger().info(json.dumps(data, ensure_ascii=False))
+            except Exception as e:
+                print(f"[Tracing] Failed to write trace: {e}")
+        print(f"[Tracing] {trace.kind} {trace.request_id}: {trace.total_ms} ms, {len(data['spans'])} spans")
+
+    @classmethod
+    def recent(cls, limit: int = 50, kind: str = None) -> list[dict]:
+        with cls._lock:
+            traces = [t for t in cls._recent if kind is None or t["kind"] == kind]
+        return traces[-limit:][::-1]
+
+    @classmethod
+    def stats(cls) -> dict:
+        """count/p50/p95/max in ms per span name (and per trace kind as "<kind> total") over the kept traces."""
+        with cls._lock:
+            traces = list(cls._recent)
+        durations = {}
+        for trace in traces:
+            durations.setdefault(f"{trace['kind']} total", []).append(trace["total_ms"])
+            for s in trace["spans"]:
+                durations.setdefault(s["name"], []).append(s["ms"])
+        return {name: _percentiles(values) for name, values in sorted(durations.items())}
+
+    @classmethod
+    def _get_logger(cls) -> logging.Logger:
+        if cls._logger is None:
+            TRACE_LOG.parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(TRACE_LOG, maxBytes=TRACE_LOG_BYTES, backupCount=TRACE_LOG_BACKUPS,
+                                          encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger = logging.getLogger("mira.traces")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            cls._logger = logger
+        return cls._logger
+
+def _percentiles(values: list[float]) -> dict:
+    values = sorted(values)
+    def at(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+    return {"count": len(values), "p50": at(0.5), "p95": at(0.95), "max": values[-1]}
@@ -1,29 +1,56 @@
 # services.tts.py
 
 import os
+import hashlib
+import queue
+import threading
+import time
 import torch
-import torchaudio
 import re
-import dateparser
+import wave
 from datetime import datetime
 from TTS.tts.configs.xtts_config import XttsConfig
 from TTS.tts.models.xtts import Xtts
 from services.config import BASE_PATH
 from services.db_get import GetDB
+from services import tracing
+from services.tts_cache import TTSCache
+from services.tts_normalize import normalize_text
 
 model = None
 gpt_latent = None
 speaker_embedding = None
+voice_name = None     # active voice: a WAV in VOICE_DIR
+voice_id = None       # content hash of the speaker reference
+model_version = None  # hash of the XTTS config and checkpoint sizes
+tts_cache = None
 
 MODEL_DIR = BASE_PATH / "static" / "xtts-v2"
-REFERENCE_WAV = MODEL_DIR / "samples" / "en_sample.wav"
-CUSTOM_WAV = MODEL_DIR / "samples" / "custom_24k.wav"
+VOICE_DIR = MODEL_DIR / "samples"
+REFERENCE_WAV = VOICE_DIR / "en_sample.wav"
+CUSTOM_WAV = VOICE_DIR / "custom_24k.wav"
+# conditioning latents per voice, <voice>.<wav hash>.<model version>.pt: recomputed only when either changes
+LATENT_DIR = VOICE_DIR / "latents"
+_voices = {} # voice name -> (wav hash, gpt_latent, speaker_embedding), loaded this run
+# held while the model is in use: a TTSWorker job or a voice switch (latent extraction, swapping the globals)
+_model_lock = threading.Lock()
 
 SAMPLE_RATE = 24000
 LANGUAGE = "en"
+SAMPLING = dict(temperature=0.7, length_penalty=1.0, repetition_penalty=2.0, top_k=50, top_p=0.85, speed=1.0)
+
+# Streaming: XTTS hands out audio every STREAM_CHUNK_SIZE GPT tokens (~0.2-0.5 s of speech) and the pipeline
+# pushes it over Socket.IO (voice_segment), so playback starts after the first piece instead of the first chunk.
+TTS_STREAMING = True
+STREAM_CHUNK_SIZE = 20
+
+# Synthesized chunks are kept on disk (services/tts_cache.py), repeated sentences skip inference
+TTS_CACHE_ENABLED = True
+TTS_CACHE_DIR = BASE_PATH / "temp" / "tts_cache"
+TTS_CACHE_BYTES = 256 * 1024 * 1024
 
 def init_tts():
-    global model, gpt_latent, speaker_embedding
+    global model, model_version, tts_cache
 
     config = XttsConfig()
     config.load_json(os.path.join(MODEL_DIR, "config.json"))
@@ -42,306 +69,289 @@ def init_tts():
     else:
         model.to("cpu")
 
-    print("[XTTS] Extracting speaker latents...")
+    model_version = _file_hash(MODEL_DIR / "config.json") + "-" + "-".join(
+        str(f.stat().st_size) for f in sorted(MODEL_DIR.glob("*.pth")))
     audio_file = CUSTOM_WAV if CUSTOM_WAV.exists() else REFERENCE_WAV
-    gpt_latent, speaker_embedding = model.get_conditioning_latents(audio_path=[audio_file])
+    set_voice(audio_file.stem)
+
+    if TTS_CACHE_ENABLED:
+        tts_cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_BYTES, SAMPLE_RATE)
     print("[XTTS] Ready.")
 
-def voice_out(text, timestamp=None, output_dir=BASE_PATH / "static" / "temp"):
+def list_voices() -> list[dict]:
+    """The speaker references in VOICE_DIR; persisted: latents on disk for the current WAV and model."""
+    voices = []
+    for path in sorted(VOICE_DIR.glob("*.wav")):
+        voices.append({
+            "name": path.stem,
+            "active": path.stem == voice_name,
+            "persisted": any(LATENT_DIR.glob(f"{path.stem}.*.{model_version}.pt")),
+        })
+    return voices
+
+def set_voice(name: str) -> bool:
+    """
+    Makes VOICE_DIR/<name>.wav the speaking voice. Latents come from memory, then LATENT_DIR, and are only
+    computed (and persisted) if neither matches the WAV content and model. False for an unknown voice.
+    Waits for the running TTS job, the next job speaks with the new voice.
+    """
+    global gpt_latent, speaker_embedding, voice_id, voice_name
+    path = VOICE_DIR / f"{name}.wav"
+    if model is None or name not in {p.stem for p in VOICE_DIR.glob("*.wav")}:
+        return False
+    with _model_lock:
+        wav_hash = _file_hash(path)
+        cached = _voices.get(name)
+        if cached is None or cached[0] != wav_hash:
+            _voices[name] = (wav_hash, *_load_latents(path, wav_hash))
+        voice_id, gpt_latent, speaker_embedding = _voices[name]
+        voice_name = name
+    print(f"[XTTS] Voice: {name}")
+    return True
+
+def _load_latents(path, wav_hash: str):
+    latent_file = LATENT_DIR / f"{path.stem}.{wav_hash}.{model_version}.pt"
+    if latent_file.exists():
+        try:
+            data = torch.load(latent_file, map_location=next(model.parameters()).device)
+            print(f"[XTTS] Loaded speaker latents for {path.stem}.")
+            return data["gpt_latent"], data["speaker_embedding"]
+        except Exception as e:
+            print(f"[XTTS] Failed to load {latent_file.name}, recomputing: {e}")
+
+    print(f"[XTTS] Extracting speaker latents for {path.stem}...")
+    latent, embedding = model.get_conditioning_latents(audio_path=[str(path)])
+    try:
+        LATENT_DIR.mkdir(parents=True, exist_ok=True)
+        torch.save({"gpt_latent": latent.cpu(), "speaker_embedding": embedding.cpu()}, latent_file)
+        # latents of an older WAV or model version of this voice
+        for stale in LATENT_DIR.glob(f"{path.stem}.*.pt"):
+            if stale != latent_file:
+                stale.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"[XTTS] Could not persist speaker latents: {e}")
+    return latent, embedding
+
+def _file_hash(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def voice_out(text, timestamp=None, output_dir=BASE_PATH / "static" / "temp", on_audio=None, cancelled=None):
+    """
+    Synthesizes text chunk by chunk (split_into_chunks). Call through TTSWorker, it owns the model.
+    - Without on_audio every chunk is written to output_dir/output_<i>_<timestamp>.wav.
+    - on_audio(seq, pcm, last): streaming, 16-bit mono PCM at SAMPLE_RATE is handed over as XTTS produces it
+      and nothing is written. last is set on the final piece.
+    - cancelled(): checked before every chunk (streaming: every piece), True stops the synthesis.
+    """
     if model is None or gpt_latent is None or speaker_embedding is None:
         raise RuntimeError("XTTS not initialized. Call init_tts() first.")
+    # one voice for the whole reply (and its cache keys), even if set_voice runs in between
+    speaker, latent, embedding = voice_id, gpt_latent, speaker_embedding
 
-    text = normalize_text(text)
+    with tracing.span("tts normalize", chars=len(text)):
+        text = normalize_text(text)
 
     if timestamp is None:
         timestamp, chunks = split_into_chunks(text)
     else:
         _, chunks = split_into_chunks(text)
 
-    paths = []
+    if on_audio is not None:
+        on_audio = _first_audio_traced(on_audio)
+    seq = 0
 
     for i, chunk in enumerate(chunks):
-        print(f"[XTTS] Synthesizing chunk {i+1}/{len(chunks)}: \"{chunk}\"")
-        output = model.inference(
-            text=chunk,
-            language=LANGUAGE,
-            gpt_cond_latent=gpt_latent,
-            speaker_embedding=speaker_embedding,
-            temperature=0.7,
-            length_penalty=1.0,
-            repetition_penalty=2.0,
-            top_k=50,
-            top_p=0.85,
-            speed=1.0,
-            enable_text_splitting=False
-        )
-
-        filename = f"output_{i+1}_{timestamp}.wav"
-        path = output_dir / filename
-        torchaudio.save(path, torch.tensor(output["wav"]).unsqueeze(0), SAMPLE_RATE)
-        paths.append(f"/static/temp/{filename}")
-
-def normalize_text(text):
-    print("[XTTS] Normalizing text")
-    # Replace DD.MM.YYYY or DD-MM-YYYY or DD/MM/YYYY with spoken English format
-    def replace_date(match):
-        raw = match.group(0)
-        # Try to parse with day-first (common in Europe) then month-first
-        parsed = dateparser.parse(raw, settings={'PREFER_DAY_OF_MONTH': 'first'}) or \
-                 dateparser.parse(raw, settings={'PREFER_DAY_OF_MONTH': 'last'})
-        if not parsed:
-            return raw
-
-        day = parsed.day
-        month_name = parsed.strftime("%B")  # full month name
-
-        # Ordinal for day (1st, 2nd, 3rd, 4th...)
-        ordinal = lambda \
-            n: f"{n}th" if 10 <= n % 100 <= 20 else f"{n}{'ts'[-2:] if n % 10 == 1 else 'nd' if n % 10 == 2 else 'rd' if n % 10 == 3 else 'th'}"
-        day_spoken = ordinal(day)
-
-        year_spoken = year_to_words(parsed.year)
-
-        # Natural spoken format: "the twenty-third of November, twenty twenty-four"
-        # or just "November twenty-third, twenty twenty-four" — both common
-        # XTTS sounds excellent with either; many prefer without "the" and "of"
-        return f"{month_name} the {day_spoken}, {year_spoken}"
-
-    # Replace HH:MM time format (24-hour or 12-hour) with spoken form
-    def replace_time(match):
-        raw = match.group(0)
-        parsed = dateparser.parse(raw)
-        if not parsed:
-            return raw
-        hour = parsed.hour
-        minute = parsed.minute
-        hour_spoken = str(hour) if hour > 0 else "zero"
-        if minute == 0:
-            return f"{hour_spoken} o'clock"
-        return f"{hour_spoken} {minute:02d}"
-
-    # Match common date formats
-    text = re.sub(r"\b\d{1,2}[./-]\d{1,2}[./-]\d{4}\b", replace_date, text)
-
-    # Normalize time (HH:MM or H:MM)
-    text = re.sub(r"\b\d{1,2}:\d{2}\b", replace_time, text)
-
-    # Replace mathematical operators with spoken equivalents
-    # Minus sign before numbers (e.g., -5, -3.14, -.7)
-    text = re.sub(r"-(?=\d)", " minus ", text)
-    # Rest of the operators
-    operator_map = {
-        r"\+\=": "plus equals",
-        r"\-\=": "minus equals",
-        r"\*\=": "times equals",
-        r"\/\=": "divided by equals",
-        r"\+\+": "plus plus",
-        r"\-\-": "minus minus",
-        r"\=\=": "equals equals",
-        r"\!\=": "not equals",
-        r"\>=": "greater than or equal to",
-        r"\<=": "less than or equal to",
-        r"\>": "greater than",
-        r"\<": "less than",
-        r"\=": "equals",
-        r"\+": "plus",
-    }
-    # Apply operator_map
-    for pattern, spoken in operator_map.items():
-        text = re.sub(pattern, f" {spoken} ", text)
-
-    # Remove Markdown bold markup **, italic markup * and ```
-    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)
-    text = re.sub(r"\*(.*?)\*", r"\1", text)
-    text = re.sub(r"```", "", text)
-
-    # --- CURRENCY NORMALIZATION ---
-    currency_symbols = {
-        r"\$": "dollar",  # USD, AUD, CAD, etc.
-        r"\$US": "US dollar",  # explicit
-        r"£": "pound",  # GBP
-        r"€": "euro",  # EUR
-        r"¥": "yen",  # JPY / CNY
-        r"¥CN": "yuan",  # explicit Chinese yuan
-        r"₹": "rupee",  # INR
-        r"₽": "ruble",  # RUB
-        r"₩": "won",  # KRW
-        r"₿": "bitcoin",  # BTC
-        r"Fr": "franc",  # CHF (Swiss franc), also used in some African currencies
-        r"R\$": "real",  # BRL
-        r"A\$": "Australian dollar",
-        r"C\$": "Canadian dollar",
-        r"NZ\$": "New Zealand dollar",
-    }
-
-    # Amounts with optional decimals and spaces
-    currency_pattern = r"""
-        (?:
-            (?:{symbols})           # currency symbol
-            \s*                     # optional space
-            ([\d,]+(?:\.\d+)?)      # number: 1,234.56 or 1234 or 1234.5
-            |
-            ([\d,]+(?:\.\d+)?)      # number first
-            \s*
-            (?:{symbols})           # then symbol
-        )
-    """.format(symbols="|".join(re.escape(s) for s in currency_symbols.keys()))
-
-    # Build the regex properly (verbose + ignorecase)
-    currency_regex = re.compile(currency_pattern, re.VERBOSE | re.IGNORECASE)
-
-    def replace_currency(match):
-        # Figure out which part matched
-        amount_str = next((g for g in match.groups() if g), "").replace(",", "")
-        symbol = None
-        for sym in currency_symbols:
-            if re.search(re.escape(sym), match.group(0), re.IGNORECASE):
-                symbol = sym
-                break
-
-        if not amount_str or not symbol:
-            return match.group(0)
-
-        # Clean amount
-        try:
-            amount = float(amount_str)
-        except:
-            return match.group(0)
-
-        currency_name = currency_symbols[symbol].split()[-1]  # use last word (e.g. "US dollar" → "dollar")
-
-        # Integer part
-        dollars = int(amount)
-        cents = int(round((amount - dollars) * 100)) if '.' in amount_str else 0
-
-        if cents > 0:
-            return f"{number_to_words(dollars)} {currency_name}s and {number_to_words(cents)} cents"
-        else:
-            if dollars == 1:
-                return f"one {currency_name}"
-            elif dollars == 0:
-                return f"zero {currency_name}s"
+        if cancelled is not None and cancelled():
+            print(f"[XTTS] Cancelled {timestamp} before chunk {i+1}/{len(chunks)}.")
+            return
+        last_chunk = i == len(chunks) - 1
+        path = output_dir / f"output_{i+1}_{timestamp}.wav"
+        with tracing.span("tts chunk", index=i + 1, chars=len(chunk)) as span:
+            key = None
+            if tts_cache is not None:
+                key = TTSCache.make_key(chunk, speaker, {**SAMPLING, "language": LANGUAGE}, model_version)
+                pcm = tts_cache.get(key)
+                span["cached"] = pcm is not None
+                if pcm is not None:
+                    print(f"[XTTS] Cached chunk {i+1}/{len(chunks)}: \"{chunk}\"")
+                    if on_audio is not None:
+                        on_audio(seq, pcm, last_chunk)
+                        seq += 1
+                    else:
+                        _write_wav(path, pcm)
+                    continue
+
+            print(f"[XTTS] Synthesizing chunk {i+1}/{len(chunks)}: \"{chunk}\"")
+            if on_audio is not None:
+                pieces = []
+                seq = _stream_chunk(chunk, (latent, embedding), on_audio, seq, last_chunk, cancelled, pieces)
+                pcm = b"".join(pieces)
+                if cancelled is not None and cancelled():
+                    continue # partial audio, don't cache it
             else:
-                return f"{number_to_words(dollars)} {currency_name}s"
-
-    # Simple but excellent number-to-words for currency (0–999,999)
-    def number_to_words(n: int) -> str:
-        if n == 0: return "zero"
-        ones = ["", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
-                "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
-                "seventeen", "eighteen", "nineteen"]
-        tens = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
-
-        if n < 20:
-            return ones[n]
-        if n < 100:
-            return tens[n // 10] + (f"-{ones[n % 10]}" if n % 10 else "")
-        if n < 1000:
-            return ones[n // 100] + " hundred" + (" " + number_to_words(n % 100) if n % 100 else "")
-        if n < 1000000:
-            return number_to_words(n // 1000) + " thousand" + (" " + number_to_words(n % 1000) if n % 1000 else "")
-        return str(n)
-
-    # Actually apply it
-    text = currency_regex.sub(replace_currency, text)
-
-    return text
-
-def year_to_words(year: int) -> str:
+                output = model.inference(
+                    text=chunk,
+                    language=LANGUAGE,
+                    gpt_cond_latent=latent,
+                    speaker_embedding=embedding,
+                    enable_text_splitting=False,
+                    **SAMPLING
+                )
+                pcm = _to_pcm16(output["wav"])
+                _write_wav(path, pcm)
+            if key is not None:
+                tts_cache.put(key, pcm)
+
+def _write_wav(path, pcm: bytes):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(pcm)
+
+def _stream_chunk(chunk, voice, on_audio, seq, last_chunk, cancelled=None, pieces=None):
     """
-    Convert a year (any positive integer) into natural spoken English as used by native speakers
-    and preferred by TTS systems like XTTS-v2, Piper, etc.
-
-    Examples:
-        1999 → "nineteen ninety nine"
-        2009 → "two thousand and nine"  or "twenty oh nine" (both common, we prefer the clearer one)
-        1905 → "nineteen oh five"
-        2000 → "two thousand"
-        2024 → "twenty twenty four"
-        1876 → "eighteen seventy six"
-        3048 → "three thousand and forty eight"
-        987  → "nine hundred and eighty seven"
+    Streams one chunk to on_audio, one piece behind so the final piece can be flagged. Returns the next seq.
+    voice: (gpt_latent, speaker_embedding) of the reply. pieces: collects the PCM for the cache.
     """
-    if year < 0:
-        return str(year)
-
-    s = ""
-
-    if year == 2000:
-        return "two thousand"
-    if year < 1000:  # e.g. 987
-        hundreds = year // 100
-        tens = year % 100
-
-        if hundreds:
-            s += f"{_small(hundreds)} hundred"
-            if tens:
-                s += " and "
-        if tens:
-            s += _small(tens) if tens >= 20 or tens == 0 else f"oh {_small(tens)}"
-        return s
-
-    if 1000 <= year < 10000:
-        thousands = year // 1000
-        remainder = year % 1000
-
-        s = f"{_small(thousands)} thousand"
-
-        if remainder == 0:
-            return s  # e.g. 2000, 3000
-
-        if remainder < 100:  # 2005, 1907, 3011 → "oh" style
-            if remainder < 10:
-                s += f" oh {_small(remainder)}"
-            else:
-                s += f" {_small(remainder)}"  # 2005 → "two thousand oh five" is also acceptable
-        else:
-            # 2001-2099, 2100+, etc.
-            if thousands >= 2 or remainder >= 100:
-                # Modern style: 2001 = "two thousand and one", 2024 = "twenty twenty-four"
-                if 100 <= remainder <= 999:
-                    hundreds = remainder // 100
-                    tens = remainder % 100
-                    if hundreds:
-                        s += f" {hundreds} hundred"
-                        if tens:
-                            s += f" and {tens}" if tens < 10 else f" {tens}"
-                    else:
-                        s += f" and {tens}"
-                else:
-                    s += f" and {remainder}"
-            else:
-                # 2000–2019 often spoken as "twenty oh one", "twenty nineteen", etc.
-                # But XTTS sounds better with "two thousand and one", "two thousand nineteen"
-                if remainder <= 19:
-                    s += f" and {_small(remainder)}"
-                else:
-                    s += f" {_small(remainder)}"
-
-        return s.strip()
-
-    # For years >= 10000, just say the digits (rare anyway)
-    return str(year)
-
-# Helper for numbers 0–19 and tens
-_small_numbers = [
-    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
-    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"
-]
-_tens = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
-
-def _small(n: int) -> str:
-    if n < 20:
-        return _small_numbers[n]
-    else:
-        ten = n // 10
-        one = n % 10
-        if one == 0:
-            return _tens[ten]
-        else:
-            # Use space instead of hyphen
-            return f"{_tens[ten]} { _small_numbers[one] }"
-
+    pending = None
+    for wav in model.inference_stream(
+        chunk,
+        LANGUAGE,
+        voice[0],
+        voice[1],
+        stream_chunk_size=STREAM_CHUNK_SIZE,
+        enable_text_splitting=False,
+        **SAMPLING
+    ):
+        if cancelled is not None and cancelled():
+            return seq
+        if pending is not None:
+            on_audio(seq, pending, False)
+            seq += 1
+        pending = _to_pcm16(wav)
+        if pieces is not None:
+            pieces.append(pending)
+    if pending is not None:
+        on_audio(seq, pending, last_chunk)
+        seq += 1
+    return seq
+
+def _to_pcm16(wav) -> bytes:
+    wav = torch.as_tensor(wav).squeeze().clamp(-1.0, 1.0)
+    return (wav * 32767).to(torch.int16).cpu().numpy().tobytes()
+
+def _first_audio_traced(on_audio):
+    started = time.monotonic()
+    def traced(seq, pcm, last):
+        if seq == 0:
+            tracing.record("tts first audio", started, time.monotonic())
+        on_audio(seq, pcm, last)
+    return traced
+
+class _TTSJob:
+    def __init__(self, request_id: str, text: str, timestamp: str, owner, on_audio):
+        self.request_id = request_id
+        self.text = text
+        self.timestamp = timestamp
+        self.owner = owner
+        self.on_audio = on_audio
+        self.trace = tracing.fork() # released when the job ran or was dropped
+        self.cancelled = False
+
+class TTSWorker:
+    """
+    One thread owns the XTTS model and voices the queued replies in order, instead of a thread per reply
+    running inference concurrently.
+        - Jobs are keyed by request id. cancel(request_id) / cancel_owner(owner) drop queued jobs and stop a
+          running one before its next chunk (streaming: its next piece).
+        - Barge-in: a new message or recording of the same owner (chat session) cancels its stale speech.
+        - clean_voice_chunks() keeps the files of queued and running jobs.
+        - Jobs run under _model_lock, set_voice takes it too: a switch never overlaps inference.
+    """
+    _lock = threading.Lock()
+    _queue = queue.Queue()
+    _jobs = {}          # request_id -> job, queued or running
+    _worker = None
+    running = None
+    completed = 0
+    cancelled = 0
+
+    @classmethod
+    def submit(cls, text: str, timestamp: str, request_id: str = None, owner=None, on_audio=None) -> str:
+        """Queues text for synthesis (voice_out arguments). Returns the request id."""
+        job = _TTSJob(request_id or timestamp, text, timestamp, owner, on_audio)
+        with cls._lock:
+            if cls._worker is None or not cls._worker.is_alive():
+                cls._worker = threading.Thread(target=cls._run, name="tts", daemon=True)
+                cls._worker.start()
+            cls._jobs[job.request_id] = job
+        cls._queue.put(job)
+        return job.request_id
+
+    @classmethod
+    def cancel(cls, request_id: str) -> bool:
+        with cls._lock:
+            job = cls._jobs.get(request_id)
+            if job is None or job.cancelled:
+                return False
+            job.cancelled = True
+            cls.cancelled += 1
+        print(f"[XTTS] Cancelled {request_id}.")
+        return True
+
+    @classmethod
+    def cancel_owner(cls, owner) -> int:
+        """Cancels every queued or running job of owner. Returns how many."""
+        with cls._lock:
+            request_ids = [job.request_id for job in cls._jobs.values() if job.owner == owner]
+        return sum(cls.cancel(request_id) for request_id in request_ids)
+
+    @classmethod
+    def active_timestamps(cls) -> set:
+        with cls._lock:
+            return {job.timestamp for job in cls._jobs.values() if not job.cancelled}
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "queued": cls._queue.qsize(),
+            "running": cls.running,
+            "completed": cls.completed,
+            "cancelled": cls.cancelled,
+        }
+
+    @classmethod
+    def _run(cls):
+        while True:
+            job = cls._queue.get()
+            if job.cancelled:
+                cls._finish(job)
+                continue
+            cls.running = job.request_id
+            try:
+                with tracing.attached(job.trace), _model_lock:
+                    job.trace = None # released by attached()
+                    voice_out(job.text, job.timestamp, on_audio=job.on_audio, cancelled=lambda: job.cancelled)
+            except Exception as e:
+                print(f"[XTTS] Error in {job.request_id}: {e}")
+            finally:
+                cls.running = None
+                cls.completed += 1
+                cls._finish(job)
+
+    @classmethod
+    def _finish(cls, job: _TTSJob):
+        with cls._lock:
+            if cls._jobs.get(job.request_id) is job:
+                del cls._jobs[job.request_id]
+        if job.trace is not None:
+            job.trace.release()
+            job.trace = None
 
 def split_into_chunks(text, max_chars=200):
     # Split by sentence boundaries
@@ -362,8 +372,11 @@ def split_into_chunks(text, max_chars=200):
     return timestamp, chunks
 
 def clean_voice_chunks(output_dir=BASE_PATH / "static" / "temp"):
-    # Clean old output files BEFORE chunking
+    # Clean old output files BEFORE chunking, but not those a queued or running job writes
+    active = TTSWorker.active_timestamps()
     for f in output_dir.glob("output_*.wav"):
+        if f.stem.rsplit("_", 1)[-1] in active:
+            continue
         try:
             f.unlink()
         except Exception as e:
@@ -0,0 +1,127 @@
+# services.tts_cache.py
+
+import hashlib
+import json
+import os
+import threading
+import wave
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+class TTSCache:
+    """
+    Content addressed on-disk cache of synthesized chunks (16-bit mono WAV per entry).
+
+    Mira repeats a lot of sentences: action confirmations, greetings, weather boilerplate, error messages.
+    A chunk is keyed by hash(normalized text, voice, sampling parameters, model version), so a changed
+    speaker reference, sampling setting or checkpoint never serves stale audio.
+    - LRU evicted by total file size; recency survives restarts through the file mtime.
+    - Reports hit rate, bytes and seconds of audio served from the cache (what synthesis was saved).
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int, sample_rate: int):
+        self.dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self.entries: "OrderedDict[str, int]" = OrderedDict() # key -> file size, least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def make_key(text: str, voice: str, params: dict, model_version: str) -> str:
+        payload = json.dumps([text, voice, sorted(params.items()), model_version], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """PCM of the entry, or None."""
+        with self._lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with wave.open(str(path), "rb") as wf:
+                pcm = wf.readframes(wf.getnframes())
+            os.utime(path)
+        except (OSError, wave.Error) as e:
+            print(f"[TTSCache] Dropping unreadable entry {key[:12]}: {e}")
+            self._remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(pcm)
+            self.seconds_saved += len(pcm) / 2 / self.sample_rate
+        return pcm
+
+    def put(self, key: str, pcm: bytes):
+        if not pcm or len(pcm) > self.max_bytes:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with wave.open(str(tmp), "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(self.sample_rate)
+                wf.writeframes(pcm)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[TTSCache] Failed to store {key[:12]}: {e}")
+            return
+        size = path.stat().st_size
+        with self._lock:
+            self.bytes += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            evict = []
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, old_size = self.entries.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+                evict.append(old_key)
+        for old_key in evict:
+            self._path(old_key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "bytes_saved": self.bytes_saved,
+                "seconds_saved": round(self.seconds_saved, 1),
+            }
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{key}.wav"
+
+    def _remove(self, key: str):
+        with self._lock:
+            self.bytes -= self.entries.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _load(self):
+        if not self.dir.exists():
+            return
+        files = sorted(self.dir.glob("*.wav"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self.entries[path.stem] = size
+            self.bytes += size
+        for tmp in self.dir.glob("*.tmp"):
+            tmp.unlink(missing_ok=True)
+        print(f"[TTSCache] {len(self.entries)} entries, {self.bytes / 1024 / 1024:.1f} MB.")
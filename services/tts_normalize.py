@@ -0,0 +1,340 @@
+# services.tts_normalize.py
+
+import re
+import sys
+import time
+from datetime import date
+
+"""
+Text normalization ahead of XTTS: dates, times, operators, Markdown and currency amounts become speakable text.
+Everything is compiled once at import; a reply goes through a handful of precompiled passes:
+    1. dates (DD.MM.YYYY, DD-MM-YYYY, DD/MM/YYYY) and times (HH:MM) in one pattern, parsed by hand.
+       dateparser is imported only for what the hand parser rejects (e.g. a month-first 06/13/2025).
+    2. minus signs, operators and ``` in one alternation, longest operator first, left to right.
+    3. Markdown bold, then italic.
+    4. currency amounts.
+GOLDEN holds the expected output for a corpus of typical replies;
+python -m services.tts_normalize checks it and measures chars/sec on long chat replies.
+"""
+_DATE_TIME = re.compile(r"\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b|\b(\d{1,2}):(\d{2})\b")
+
+_OPERATORS = {
+    "+=": "plus equals",
+    "-=": "minus equals",
+    "*=": "times equals",
+    "/=": "divided by equals",
+    "++": "plus plus",
+    "--": "minus minus",
+    "==": "equals equals",
+    "!=": "not equals",
+    ">=": "greater than or equal to",
+    "<=": "less than or equal to",
+    ">": "greater than",
+    "<": "less than",
+    "=": "equals",
+    "+": "plus",
+}
+# minus before a number (-5, -3.14) first; "--" only when not followed by one ("--5" is "-" and "minus 5")
+_OPERATOR_PASS = re.compile(
+    r"(?P<minus>-(?=\d))|(?P<ticks>```)|(?P<op>--(?!\d)|" +
+    "|".join(re.escape(op) for op in _OPERATORS if op != "--") + ")")
+
+_BOLD = re.compile(r"\*\*(.*?)\*\*")
+_ITALIC = re.compile(r"\*(.*?)\*")
+
+_CURRENCY_SYMBOLS = {
+    "$": "dollar",  # USD, AUD, CAD, etc.
+    "$US": "US dollar",  # explicit
+    "£": "pound",  # GBP
+    "€": "euro",  # EUR
+    "¥": "yen",  # JPY / CNY
+    "¥CN": "yuan",  # explicit Chinese yuan
+    "₹": "rupee",  # INR
+    "₽": "ruble",  # RUB
+    "₩": "won",  # KRW
+    "₿": "bitcoin",  # BTC
+    "Fr": "franc",  # CHF (Swiss franc), also used in some African currencies
+    "R$": "real",  # BRL
+    "A$": "Australian dollar",
+    "C$": "Canadian dollar",
+    "NZ$": "New Zealand dollar",
+}
+_CURRENCY_NAMES = {symbol.lower(): name for symbol, name in _CURRENCY_SYMBOLS.items()}
+_CURRENCY_PLURALS = {"real": "reais", "yen": "yen", "yuan": "yuan", "won": "won"}
+# Amounts with optional decimals and spaces, symbol before or after the number
+_CURRENCY = re.compile(r"""
+    (?:
+        ({symbols})             # currency symbol
+        \s*                     # optional space
+        (\d+(?:,\d{{3}})*(?:\.\d+)?) # number: 1,234.56 or 1234 or 1234.5 (a trailing comma is punctuation)
+        |
+        (\d+(?:,\d{{3}})*(?:\.\d+)?) # number first
+        \s*
+        ({symbols})             # then symbol
+    )
+""".format(symbols="|".join(re.escape(s) for s in sorted(_CURRENCY_SYMBOLS, key=len, reverse=True))),
+    re.VERBOSE | re.IGNORECASE) # longest symbol first: "NZ$" and "R$" before "$"
+
+def normalize_text(text: str) -> str:
+    text = _DATE_TIME.sub(_replace_date_time, text)
+    text = _OPERATOR_PASS.sub(_replace_operator, text)
+    # Remove Markdown bold markup ** and italic markup *
+    text = _BOLD.sub(r"\1", text)
+    text = _ITALIC.sub(r"\1", text)
+    return _CURRENCY.sub(_replace_currency, text)
+
+########################################################################################
+"""##########################      Dates and times      ############################"""
+########################################################################################
+def _replace_date_time(match) -> str:
+    if match.group(4) is not None:
+        return _spoken_time(match.group(0), int(match.group(4)), int(match.group(5)))
+    day, month, year = int(match.group(1)), int(match.group(2)), int(match.group(3))
+    try:
+        parsed = date(year, month, day)
+    except ValueError:
+        parsed = _dateparser_date(match.group(0))
+        if parsed is None:
+            return match.group(0)
+    # Natural spoken format: "November the 23rd, twenty twenty four"
+    return f"{parsed.strftime('%B')} the {_ordinal(parsed.day)}, {year_to_words(parsed.year)}"
+
+def _spoken_time(raw: str, hour: int, minute: int) -> str:
+    if hour > 23 or minute > 59:
+        parsed = _dateparser_parse(raw)
+        if parsed is None:
+            return raw
+        hour, minute = parsed.hour, parsed.minute
+    hour_spoken = str(hour) if hour > 0 else "zero"
+    if minute == 0:
+        return f"{hour_spoken} o'clock"
+    return f"{hour_spoken} {minute:02d}"
+
+def _ordinal(n: int) -> str:
+    if 10 <= n % 100 <= 20:
+        return f"{n}th"
+    return f"{n}{ {1: 'st', 2: 'nd', 3: 'rd'}.get(n % 10, 'th') }"
+
+def _dateparser_date(raw: str):
+    # day first (common in Europe), then month first
+    return _dateparser_parse(raw, {'PREFER_DAY_OF_MONTH': 'first'}) or \
+           _dateparser_parse(raw, {'PREFER_DAY_OF_MONTH': 'last'})
+
+def _dateparser_parse(raw: str, settings: dict = None):
+    import dateparser # slow import, only for what the hand parser rejects
+    return dateparser.parse(raw, settings=settings)
+
+########################################################################################
+"""##########################   Operators and currency  ############################"""
+########################################################################################
+def _replace_operator(match) -> str:
+    if match.group("minus"):
+        return " minus "
+    if match.group("ticks"):
+        return ""
+    return f" {_OPERATORS[match.group('op')]} "
+
+def _replace_currency(match) -> str:
+    amount_str = (match.group(2) or match.group(3) or "").replace(",", "")
+    name = _CURRENCY_NAMES.get((match.group(1) or match.group(4) or "").lower())
+    if not amount_str or name is None:
+        return match.group(0)
+    try:
+        amount = float(amount_str)
+    except ValueError:
+        return match.group(0)
+
+    whole = int(amount)
+    cents = int(round((amount - whole) * 100)) if '.' in amount_str else 0
+
+    head, last = name.rpartition(" ")[::2]
+    plural = head + (" " if head else "") + _CURRENCY_PLURALS.get(last, last + "s")
+    if cents > 0:
+        return f"{number_to_words(whole)} {plural} and {number_to_words(cents)} cents"
+    if whole == 1:
+        return f"one {name}"
+    if whole == 0:
+        return f"zero {plural}"
+    return f"{number_to_words(whole)} {plural}"
+
+_ONES = ["", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+         "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+         "seventeen", "eighteen", "nineteen"]
+_TENS_HYPHEN = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+def number_to_words(n: int) -> str:
+    """Number to words for currency amounts (0–999,999)."""
+    if n == 0:
+        return "zero"
+    if n < 20:
+        return _ONES[n]
+    if n < 100:
+        return _TENS_HYPHEN[n // 10] + (f"-{_ONES[n % 10]}" if n % 10 else "")
+    if n < 1000:
+        return _ONES[n // 100] + " hundred" + (" " + number_to_words(n % 100) if n % 100 else "")
+    if n < 1000000:
+        return number_to_words(n // 1000) + " thousand" + (" " + number_to_words(n % 1000) if n % 1000 else "")
+    return str(n)
+
+########################################################################################
+"""##############################       Years        ################################"""
+########################################################################################
+def year_to_words(year: int) -> str:
+    """
+    Convert a year (any positive integer) into natural spoken English as used by native speakers
+    and preferred by TTS systems like XTTS-v2, Piper, etc.
+
+    Examples:
+        1999 → "nineteen ninety nine"
+        2009 → "two thousand and nine"  or "twenty oh nine" (both common, we prefer the clearer one)
+        1905 → "nineteen oh five"
+        2000 → "two thousand"
+        2024 → "twenty twenty four"
+        1876 → "eighteen seventy six"
+        3048 → "three thousand and forty eight"
+        987  → "nine hundred and eighty seven"
+    """
+    if year < 0:
+        return str(year)
+
+    s = ""
+
+    if year == 2000:
+        return "two thousand"
+    if year < 1000:  # e.g. 987
+        hundreds = year // 100
+        tens = year % 100
+
+        if hundreds:
+            s += f"{_small(hundreds)} hundred"
+            if tens:
+                s += " and "
+        if tens:
+            s += _small(tens) if tens >= 20 or tens == 0 else f"oh {_small(tens)}"
+        return s
+
+    if 1000 <= year < 10000:
+        thousands = year // 1000
+        remainder = year % 1000
+
+        s = f"{_small(thousands)} thousand"
+
+        if remainder == 0:
+            return s  # e.g. 2000, 3000
+
+        if remainder < 100:  # 2005, 1907, 3011 → "oh" style
+            if remainder < 10:
+                s += f" oh {_small(remainder)}"
+            else:
+                s += f" {_small(remainder)}"  # 2005 → "two thousand oh five" is also acceptable
+        else:
+            # 2001-2099, 2100+, etc.
+            if thousands >= 2 or remainder >= 100:
+                # Modern style: 2001 = "two thousand and one", 2024 = "twenty twenty-four"
+                if 100 <= remainder <= 999:
+                    hundreds = remainder // 100
+                    tens = remainder % 100
+                    if hundreds:
+                        s += f" {hundreds} hundred"
+                        if tens:
+                            s += f" and {tens}" if tens < 10 else f" {tens}"
+                    else:
+                        s += f" and {tens}"
+                else:
+                    s += f" and {remainder}"
+            else:
+                # 2000–2019 often spoken as "twenty oh one", "twenty nineteen", etc.
+                # But XTTS sounds better with "two thousand and one", "two thousand nineteen"
+                if remainder <= 19:
+                    s += f" and {_small(remainder)}"
+                else:
+                    s += f" {_small(remainder)}"
+
+        return s.strip()
+
+    # For years >= 10000, just say the digits (rare anyway)
+    return str(year)
+
+# Helper for numbers 0–19 and tens
+_small_numbers = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen"
+]
+_tens = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+
+def _small(n: int) -> str:
+    if n < 20:
+        return _small_numbers[n]
+    else:
+        ten = n // 10
+        one = n % 10
+        if one == 0:
+            return _tens[ten]
+        else:
+            # Use space instead of hyphen
+            return f"{_tens[ten]} { _small_numbers[one] }"
+
+########################################################################################
+"""###########################   Golden corpus, bench   #############################"""
+########################################################################################
+GOLDEN = [
+    ("Meet me on 02.06.2025 at 14:30.",
+     "Meet me on June the 2nd, two thousand twenty five at 14 30."),
+    ("It's 21.11.2024, 0:00 and 7:05.",
+     "It's November the 21st, two thousand twenty four, zero o'clock and 7 05."),
+    ("The 1.3.2025, 2-3-2025, 3/3/2025 and 13.4.2025.",
+     "The March the 1st, two thousand twenty five, March the 2nd, two thousand twenty five, "
+     "March the 3rd, two thousand twenty five and April the 13th, two thousand twenty five."),
+    ("From 10:30-11:00 we talk, then lunch at 12:00.",
+     "From 10 30 minus 11 o'clock we talk, then lunch at 12 o'clock."),
+    ("x = 5 - -3 and a += b, i-- and --5; a != b, a >= b",
+     "x  equals  5 -  minus 3 and a  plus equals  b, i minus minus  and - minus 5; a  not equals  b, "
+     "a  greater than or equal to  b"),
+    ("In C++ use a == b, a <= b and a < b > c.",
+     "In C plus plus  use a  equals equals  b, a  less than or equal to  b and a  less than  b  greater than  c."),
+    ("**Bold** and *italic* and ```code```",
+     "Bold and italic and code"),
+    ("It costs €12.50 or $1,234 or 5 Fr.",
+     "It costs twelve euros and fifty cents or one thousand two hundred thirty-four dollars or five francs."),
+    ("That's £1 and €0.",
+     "That's one pound and zero euros."),
+    ("In Brazil it's R$ 10, in Auckland NZ$ 3 and in Sydney A$2.50.",
+     "In Brazil it's ten reais, in Auckland three New Zealand dollars and in Sydney two Australian dollars "
+     "and fifty cents."),
+    ("About 500¥ or 20 $US.",
+     "About five hundred yen or twenty US dollars."),
+    ("Temperatures drop to -4 degrees.",
+     "Temperatures drop to  minus 4 degrees."),
+    ("Sure. I added milk, eggs and bread to your shopping list.",
+     "Sure. I added milk, eggs and bread to your shopping list."),
+    ("Good morning! Today is 18.10.2026 and your first meeting is at 9:15.",
+     "Good morning! Today is October the 18th, two thousand twenty six and your first meeting is at 9 15."),
+]
+
+def check_golden() -> int:
+    """Prints every GOLDEN case whose output changed. Returns the number of failures."""
+    failures = 0
+    for text, expected in GOLDEN:
+        result = normalize_text(text)
+        if result != expected:
+            failures += 1
+            print(f"[Normalize] FAIL {text!r}\n\texpected {expected!r}\n\tgot      {result!r}")
+    print(f"[Normalize] Golden: {len(GOLDEN) - failures}/{len(GOLDEN)} passed.")
+    return failures
+
+def benchmark(rounds: int = 200) -> float:
+    """chars/sec of normalize_text on a long chat reply built from the corpus."""
+    reply = " ".join(text for text, _ in GOLDEN) * 4 # ~2k chars, a long answer
+    start = time.perf_counter()
+    for _ in range(rounds):
+        normalize_text(reply)
+    elapsed = time.perf_counter() - start
+    rate = len(reply) * rounds / elapsed
+    print(f"[Normalize] {len(reply)} chars x {rounds}: {elapsed / rounds * 1000:.2f} ms per reply, {rate:,.0f} chars/sec")
+    return rate
+
+# python -m services.tts_normalize: golden corpus and microbenchmark
+if __name__ == "__main__":
+    failed = check_golden()
+    benchmark()
+    sys.exit(1 if failed else 0)
@@ -1,103 +1,213 @@
 # services.weather.py
 
+import time
+import threading
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
+from services.command_registry import CommandRegistry
 debug = True
 
+# answered by the message pipeline (services/pipeline.py), so no handler
+CommandRegistry.register("weather", {"get weather": None})
+
+WEATHER_DAYS = 3           # forecast window for the weather prompt (today + 2)
+WEATHER_TTL = 30 * 60      # seconds a cached forecast is served
+WEATHER_REFRESH = 20 * 60  # background refresh interval, below the TTL so answers never wait on the fetch
+WEATHER_TIMEOUT = 10       # seconds per Open-Meteo request
+BASE_URL = "https://api.open-meteo.com/v1/forecast"
+
 def get_weather(lat, lon, date=None, debug=debug):
     weather_full = get_weather_summary(lat, lon, date, debug=debug)
     weather_formated = format_weather_summary(weather_full)
     return weather_formated
 
+def get_weather_forecast(lat, lon, days=WEATHER_DAYS, compact=True, debug=debug):
+    """
+    Formatted forecast for today and the following days (one cached request).
+    compact: one line per period instead of one per hour (format_weather_compact).
+    """
+    summaries = WeatherCache.get(lat, lon, days)
+    if summaries is None:
+        return ""
+    if debug:
+        print(summaries)
+    formatter = format_weather_compact if compact else format_weather_summary
+    return "\n\n".join(formatter(summary) for summary in summaries)
+
 def get_weather_summary(lat, lon, date=None, debug=debug):
     """
     Gets hourly weather and daily sun times from Open-Meteo for a given location and date.
     Returns a structured dictionary with sun times and hourly weather data.
+    Dates inside the cached forecast window don't cause a request.
     """
     if date is None:
         date = datetime.now().strftime("%Y-%m-%d")
     else:
         date = _normalize_date(date)
 
-    base_url = "https://api.open-meteo.com/v1/forecast"
+    summaries = WeatherCache.get(lat, lon)
+    for summary in summaries or []:
+        if summary["sun_times"]["date"] == date:
+            if debug:
+                print(summary)
+            return summary
+
+    # outside the forecast window
+    try:
+        summary = _fetch(lat, lon, date, date)[0]
+        if debug:
+            print(summary)
+        return summary
+    except Exception as e:
+        print("[Weather] Failed:", e)
+        return None
+
+def _fetch(lat, lon, start_date: str, end_date: str) -> list[dict]:
+    """
+    One Open-Meteo request for start_date..end_date, split into one summary per day.
+    """
     params = {
         "latitude": lat,
         "longitude": lon,
         "hourly": "temperature_2m,precipitation,wind_speed_10m,snowfall,snow_depth",
         "daily": "sunrise,sunset",
         "timezone": "auto",
-        "start_date": date,
-        "end_date": date
+        "start_date": start_date,
+        "end_date": end_date
     }
+    response = requests.get(BASE_URL, params=params, timeout=WEATHER_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
 
-    try:
-        response = requests.get(base_url, params=params)
-        data = response.json()
-
-        # Extract sun times
-        daily = data.get("daily", {})
-        sunrise = daily.get("sunrise", [None])[0]
-        sunset = daily.get("sunset", [None])[0]
-
-        # Extract hourly weather
-        hourly = data.get("hourly", {})
-        times = hourly.get("time", [])
-        summary = {
-            "sun_times": {"date": date, "sunrise": sunrise, "sunset": sunset},
+    # Extract sun times
+    daily = data.get("daily", {})
+    summaries = []
+    for d, date in enumerate(daily.get("time", [])):
+        summaries.append({
+            "sun_times": {"date": date, "sunrise": daily["sunrise"][d], "sunset": daily["sunset"][d]},
             "hourly": []
-        }
-
-        for i, time in enumerate(times):
-            if time.startswith(date):
-                entry = {
-                    "time": time[-5:],
-                    "temperature_c": hourly["temperature_2m"][i],
-                    "precipitation_mm": hourly["precipitation"][i],
-                    "wind_speed_kmh": hourly["wind_speed_10m"][i],
-                    "snowfall_cm": hourly.get("snowfall", [0.0])[i],
-                    "snow_depth_cm": hourly.get("snow_depth", [0.0])[i]
-                }
-                summary["hourly"].append(entry)
-        if debug:
-            print(summary)
-        return summary
-    except Exception as e:
-        print("[Weather] Failed:", e)
-        return None
+        })
+    by_date = {summary["sun_times"]["date"]: summary for summary in summaries}
+
+    # Extract hourly weather
+    hourly = data.get("hourly", {})
+    times = hourly.get("time", [])
+    snowfall = hourly.get("snowfall") or [0.0] * len(times)
+    snow_depth = hourly.get("snow_depth") or [0.0] * len(times)
+    for i, time in enumerate(times):
+        summary = by_date.get(time[:10])
+        if summary is None:
+            continue
+        summary["hourly"].append({
+            "time": time[-5:],
+            "temperature_c": hourly["temperature_2m"][i],
+            "precipitation_mm": hourly["precipitation"][i],
+            "wind_speed_kmh": hourly["wind_speed_10m"][i],
+            "snowfall_cm": snowfall[i],
+            "snow_depth_cm": snow_depth[i]
+        })
+    return summaries
+
+class WeatherCache:
+    """
+    Forecast window per location, keyed by lat/lon rounded to ~1 km.
+    Entries are served for WEATHER_TTL and dropped at day rollover; start_refresh() keeps the
+    configured location warm so a weather question only waits on the LLM.
+    """
+    _lock = threading.Lock()
+    _entries = {} # (lat, lon) -> (fetched monotonic, first date, summaries)
+    _refresh_thread = None
+
+    @classmethod
+    def get(cls, lat, lon, days=WEATHER_DAYS):
+        try:
+            key = (round(float(lat), 2), round(float(lon), 2))
+        except (TypeError, ValueError):
+            print(f"[Weather] Invalid location: {lat}, {lon}")
+            return None
+        today = datetime.now().strftime("%Y-%m-%d")
+        with cls._lock:
+            entry = cls._entries.get(key)
+        if entry is not None:
+            fetched, first_date, summaries = entry
+            if time.monotonic() - fetched < WEATHER_TTL and first_date == today and len(summaries) >= days:
+                return summaries[:days]
+        return cls._refresh(key, days)
+
+    @classmethod
+    def _refresh(cls, key, days=WEATHER_DAYS):
+        start = datetime.now()
+        end = start + timedelta(days=days - 1)
+        try:
+            summaries = _fetch(key[0], key[1], start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        except Exception as e:
+            print("[Weather] Failed:", e)
+            with cls._lock:
+                entry = cls._entries.get(key)
+            # stale data beats no data while the API is unreachable
+            return entry[2][:days] if entry is not None else None
+        with cls._lock:
+            cls._entries[key] = (time.monotonic(), start.strftime("%Y-%m-%d"), summaries)
+        return summaries
+
+    @classmethod
+    def start_refresh(cls, get_location):
+        """
+        Refreshes the forecast for get_location() every WEATHER_REFRESH seconds (daemon thread).
+        get_location returns a dict with location_latitude/location_longitude (GetDB.get_location).
+        """
+        if cls._refresh_thread is not None:
+            return
+
+        def loop():
+            while True:
+                # any failure (db, bad coordinates, parsing) must not end the thread
+                try:
+                    location = get_location() or {}
+                    lat, lon = location.get("location_latitude"), location.get("location_longitude")
+                    if lat and lon:
+                        cls._refresh((round(float(lat), 2), round(float(lon), 2)))
+                except Exception as e:
+                    print(f"[Weather] Refresh failed: {e}")
+                time.sleep(WEATHER_REFRESH)
+
+        cls._refresh_thread = threading.Thread(target=loop, name="weather-refresh", daemon=True)
+        cls._refresh_thread.start()
+        print("[Weather] Background refresh started.")
+
+def _parse_hour(time_str):
+    return int(time_str.split(":")[0])
+
+def _get_period(hour, sunrise_hour, sunset_hour):
+    if hour < sunrise_hour:
+        return "Before Sunrise"
+    elif hour == sunrise_hour:
+        return "Sunrise"
+    elif hour < 12:
+        return "Morning"
+    elif hour < 15:
+        return "Midday"
+    elif hour < sunset_hour:
+        return "Afternoon"
+    elif hour == sunset_hour:
+        return "Sundown"
+    else:
+        return "After Sundown"
 
 def format_weather_summary(summary):
     """
     Formats weather summary into readable hourly lines with contextual labels.
     """
-    def parse_hour(time_str):
-        return int(time_str.split(":")[0])
-
-    def get_period(hour, sunrise_hour, sunset_hour):
-        if hour < sunrise_hour:
-            return "Before Sunrise"
-        elif hour == sunrise_hour:
-            return "Sunrise"
-        elif hour < 12:
-            return "Morning"
-        elif hour < 15:
-            return "Midday"
-        elif hour < sunset_hour:
-            return "Afternoon"
-        elif hour == sunset_hour:
-            return "Sundown"
-        else:
-            return "After Sundown"
-
-    sunrise_hour = parse_hour(summary["sun_times"]["sunrise"][-5:])
-    sunset_hour = parse_hour(summary["sun_times"]["sunset"][-5:])
+    sunrise_hour = _parse_hour(summary["sun_times"]["sunrise"][-5:])
+    sunset_hour = _parse_hour(summary["sun_times"]["sunset"][-5:])
     dt = datetime.strptime(summary["sun_times"]["date"], "%Y-%m-%d")
     weekday = dt.strftime("%A")
     date_str = dt.strftime("%d.%m.%Y")
 
     lines = [f"- Weather forecast for {weekday}, {date_str}:"]
     for entry in summary["hourly"]:
-        hour = parse_hour(entry["time"])
-        period = get_period(hour, sunrise_hour, sunset_hour)
+        hour = _parse_hour(entry["time"])
+        period = _get_period(hour, sunrise_hour, sunset_hour)
 
         line = f"\t- {entry['time']} to {entry['time'][:-2]}59: {period}, Temperature {entry['temperature_c']}°C"
 
@@ -112,6 +222,63 @@ def format_weather_summary(summary):
         lines.append(line)
     return "\n".join(lines)
 
+def format_weather_compact(summary):
+    """
+    Formats weather summary into one line per period (Before Sunrise, Morning, ...):
+    min/max temperature, precipitation/snow windows with their peak hourly amount and the strongest wind.
+    About a third of the hourly format's size in the weather prompt (python -m services.weather compares them).
+    """
+    sunrise = summary["sun_times"]["sunrise"][-5:]
+    sunset = summary["sun_times"]["sunset"][-5:]
+    sunrise_hour = _parse_hour(sunrise)
+    sunset_hour = _parse_hour(sunset)
+    dt = datetime.strptime(summary["sun_times"]["date"], "%Y-%m-%d")
+
+    periods = [] # consecutive hours with the same period label
+    for entry in summary["hourly"]:
+        period = _get_period(_parse_hour(entry["time"]), sunrise_hour, sunset_hour)
+        if periods and periods[-1][0] == period:
+            periods[-1][1].append(entry)
+        else:
+            periods.append((period, [entry]))
+
+    lines = [f"- Weather forecast for {dt.strftime('%A')}, {dt.strftime('%d.%m.%Y')} (Sunrise {sunrise}, Sundown {sunset}):"]
+    for period, entries in periods:
+        temps = [e["temperature_c"] for e in entries]
+        low, high = min(temps), max(temps)
+        line = f"\t- {period} {_span(entries[0], entries[-1])}: "
+        line += f"{low}°C" if low == high else f"{low} to {high}°C"
+        for key, label, unit in (("precipitation_mm", "Precipitation", "mm"), ("snowfall_cm", "Snowfall", "cm")):
+            windows = _windows(entries, key)
+            if windows:
+                peak = max(e[key] for e in entries)
+                line += f", {label} " + " and ".join(_span(a, b) for a, b in windows) + f" up to {peak} {unit}"
+        depth = max(e["snow_depth_cm"] for e in entries)
+        if depth > 0:
+            line += f", Snow depth up to {depth} cm"
+        wind = max(e["wind_speed_kmh"] for e in entries)
+        if wind > 0:
+            line += f", Winds up to {wind} km/h"
+        lines.append(line)
+    return "\n".join(lines)
+
+def _span(first, last):
+    return f"{first['time']} to {last['time'][:-2]}59"
+
+def _windows(entries, key):
+    """(first, last) entries of each run of consecutive hours with entry[key] > 0."""
+    windows = []
+    start = None
+    for prev, entry in zip([None] + entries[:-1], entries):
+        if entry[key] > 0 and start is None:
+            start = entry
+        elif entry[key] <= 0 and start is not None:
+            windows.append((start, prev))
+            start = None
+    if start is not None:
+        windows.append((start, entries[-1]))
+    return windows
+
 def _normalize_date(date_str):
     """Converts various date formats to YYYY-MM-DD."""
     for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%Y%m%d"):
@@ -121,7 +288,37 @@ def _normalize_date(date_str):
             continue
     raise ValueError(f"Unsupported date format: {date_str}")
 
+def compare_formats(lat, lon, prefill=False):
+    """
+    Prints characters, tokens and (optionally) prefill time of the hourly vs the compact forecast.
+    Tokens need the main model's vocab, prefill the full model.
+    """
+    import services.config as config
+    from llama_cpp import Llama
+
+    texts = {
+        "hourly": get_weather_forecast(lat, lon, compact=False, debug=False),
+        "compact": get_weather_forecast(lat, lon, compact=True, debug=False),
+    }
+    if prefill:
+        config.init_qwen()
+        llm = config.llm
+        llm.set_cache(None)
+    else:
+        llm = Llama(model_path=str(config.MODEL_PATH), vocab_only=True, verbose=False)
+    for name, text in texts.items():
+        tokens = llm.tokenize(text.encode("utf-8"), add_bos=False)
+        line = f"[Weather] {name:>7}: {len(text):6d} chars, {len(tokens):5d} tokens"
+        if prefill:
+            llm.reset()
+            start = time.perf_counter()
+            llm.eval(tokens)
+            line += f", prefill {time.perf_counter() - start:.2f}s"
+        print(line)
+    print(texts["compact"])
+
 # Example coordinates for Bremen lat=53.07, lon=8.80,
+# python -m services.weather [--prefill]: compares the prompt formats
 if __name__ == "__main__":
-    weather = get_weather(lat=53.07, lon=8.80, date=None)
-    print(weather)
\ No newline at end of file
+    import sys
+    compare_formats(lat=53.07, lon=8.80, prefill="--prefill" in sys.argv)
\ No newline at end of file
@@ -0,0 +1,224 @@
+# services.weather_answer.py
+
+from datetime import datetime, timedelta
+from typing import Optional
+from services.intent_recall import normalize_message
+from services.weather import get_weather_summary, _parse_hour, _get_period
+
+"""
+Template answers for the common weather questions ("weather today", "will it rain tomorrow", "how cold tonight"):
+the sentence is rendered from the structured forecast (get_weather_summary) instead of an LLM generation.
+    - Every word of the question must be known (DAYS, PARTS, TOPICS, GLUE); anything else ("should I cycle to
+      work tomorrow") returns None and ask_weather runs the LLM.
+    - One topic per question, days inside the cached forecast window.
+    - Output is TTS ready: units spelled out, no symbols, same intensity scales as the weather prompt.
+"""
+WEATHER_TEMPLATES = True
+
+DAYS = {"today": 0, "tomorrow": 1}
+PARTS = {"morning", "afternoon", "evening", "tonight", "night"}
+TOPICS = {
+    "rain": {"rain", "raining", "rainy", "umbrella", "precipitation", "wet", "dry", "shower", "showers", "drizzle"},
+    "snow": {"snow", "snowing", "snowy", "snowfall"},
+    "cold": {"cold", "colder", "cool", "chilly", "freezing", "frost", "low", "lowest"},
+    "warm": {"warm", "warmer", "hot", "high", "highest"},
+    "temperature": {"temperature", "temperatures", "degrees"},
+    "wind": {"wind", "windy", "breezy", "storm", "stormy", "gusts"},
+}
+GENERAL = {"weather", "forecast"}
+GLUE = {"what", "s", "is", "the", "it", "be", "will", "going", "to", "gonna", "how", "like", "for", "in", "on",
+        "this", "does", "do", "i", "need", "an", "get", "look", "looks", "there", "any", "outside", "of", "day",
+        "after", "later", "by", "much", "a", "please", "mira", "hey", "tell", "me", "about", "can", "you", "and"}
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+PERIOD_SPEECH = {
+    "Before Sunrise": "before sunrise", "Sunrise": "around sunrise", "Morning": "in the morning",
+    "Midday": "around midday", "Afternoon": "in the afternoon", "Sundown": "around sundown",
+    "After Sundown": "in the evening",
+}
+
+def template_answer(user_msg: str, lat, lon) -> Optional[str]:
+    """TTS-ready answer, or None if the question needs the LLM."""
+    if not WEATHER_TEMPLATES:
+        return None
+    question = _parse_question(user_msg)
+    if question is None:
+        return None
+    offset, part, topic = question
+    date = datetime.now().date() + timedelta(days=offset)
+    summary = get_weather_summary(lat, lon, date.strftime("%Y-%m-%d"), debug=False)
+    if not summary:
+        return None
+    hours = _select_hours(summary, part, offset)
+    if part == "night":
+        # the coldest hours of the night are after midnight
+        following = get_weather_summary(lat, lon, (date + timedelta(days=1)).strftime("%Y-%m-%d"), debug=False)
+        if following:
+            hours += _select_hours(following, "before sunrise", offset + 1)
+    if not hours:
+        return None
+    answer = _render(topic, _when(offset, part, date), hours, summary)
+    print(f"[Weather] Template answer: {answer}")
+    return answer
+
+########################################################################################
+"""#############################        Parsing        ##############################"""
+########################################################################################
+def _parse_question(user_msg: str) -> Optional[tuple]:
+    """(day offset, part of day or None, topic) or None if any word is outside the vocabulary."""
+    words = normalize_message(user_msg).split()
+    offset, part, topics, general = None, None, set(), False
+    today = datetime.now().weekday()
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if words[i:i + 3] == ["day", "after", "tomorrow"]:
+            offset = _set_once(offset, 2)
+            i += 3
+            continue
+        if word in DAYS:
+            offset = _set_once(offset, DAYS[word])
+        elif word in WEEKDAYS:
+            offset = _set_once(offset, (WEEKDAYS.index(word) - today) % 7)
+        elif word in PARTS:
+            part = _set_once(part, "night" if word in ("tonight", "night") else word)
+        elif word in GENERAL:
+            general = True
+        elif any(word in synonyms for synonyms in TOPICS.values()):
+            topics |= {topic for topic, synonyms in TOPICS.items() if word in synonyms}
+        elif word not in GLUE:
+            return None
+        if offset is False or part is False:
+            return None # two different days/parts: free-form
+        i += 1
+    if len(topics) > 1 and topics - {"temperature"} <= {"cold", "warm"}:
+        topics.discard("temperature") # "lowest temperature", "how warm is the temperature"
+    if len(topics) > 1 or (not topics and not general):
+        return None
+    if offset is None:
+        offset = 0
+    return offset, part, topics.pop() if topics else "general"
+
+def _set_once(current, value):
+    """value, or False if a different value was already set."""
+    return value if current is None or current == value else False
+
+def _select_hours(summary: dict, part: Optional[str], offset: int) -> list[dict]:
+    sunrise_hour = _parse_hour(summary["sun_times"]["sunrise"][-5:])
+    sunset_hour = _parse_hour(summary["sun_times"]["sunset"][-5:])
+    now_hour = datetime.now().hour if offset == 0 else 0
+    ranges = {
+        None: (now_hour, 23),
+        "morning": (sunrise_hour, 11),
+        "afternoon": (12, sunset_hour),
+        "evening": (sunset_hour, 22),
+        "night": (sunset_hour, 23),
+        "before sunrise": (0, sunrise_hour),
+    }
+    first, last = ranges[part]
+    first = max(first, now_hour)
+    return [entry for entry in summary["hourly"] if first <= _parse_hour(entry["time"]) <= last]
+
+########################################################################################
+"""#############################       Rendering       ##############################"""
+########################################################################################
+def _render(topic: str, when: str, hours: list[dict], summary: dict) -> str:
+    temps = [entry["temperature_c"] for entry in hours]
+    low, high = _degrees(min(temps)), _degrees(max(temps))
+    rain = _windows(hours, summary, "precipitation_mm")
+    snow = _windows(hours, summary, "snowfall_cm")
+    wind = max(entry["wind_speed_kmh"] for entry in hours)
+    spoken_when = when[0].upper() + when[1:]
+
+    if topic == "rain":
+        if not rain:
+            return f"It stays dry {when}."
+        peak = max(entry["precipitation_mm"] for entry in hours)
+        return f"Expect {_precipitation_word(peak)} {when}, {rain}, up to {_number(peak)} millimeter per hour."
+    if topic == "snow":
+        if not snow:
+            return f"There is no snow in the forecast {when}."
+        peak = max(entry["snowfall_cm"] for entry in hours)
+        return f"Expect {_snowfall_word(peak)} {when}, {snow}, up to {_number(peak)} centimeter per hour."
+    if topic == "cold":
+        return f"{spoken_when} it gets as cold as {low}."
+    if topic == "warm":
+        return f"{spoken_when} it gets up to {high}."
+    if topic == "temperature":
+        return f"{spoken_when} temperatures range from {low} to {high}."
+    if topic == "wind":
+        return f"{spoken_when} expect {_wind_word(wind)} with winds up to {_number(wind)} kilometer per hour."
+
+    sentences = [f"{spoken_when} temperatures range from {low} to {high}."]
+    if rain:
+        peak = max(entry["precipitation_mm"] for entry in hours)
+        sentences.append(f"Expect {_precipitation_word(peak)} {rain}.")
+    if snow:
+        peak = max(entry["snowfall_cm"] for entry in hours)
+        sentences.append(f"Expect {_snowfall_word(peak)} {snow}.")
+    if not rain and not snow:
+        sentences.append("It stays dry.")
+    sentences.append(f"Winds up to {_number(wind)} kilometer per hour, {_wind_word(wind)}.")
+    return " ".join(sentences)
+
+def _when(offset: int, part: Optional[str], date) -> str:
+    if part == "night":
+        return "tonight" if offset == 0 else f"{_day_name(offset, date)} night"
+    day = "today" if offset == 0 else _day_name(offset, date)
+    if part is None:
+        return day
+    return f"this {part}" if offset == 0 else f"{day} {part}"
+
+def _day_name(offset: int, date) -> str:
+    return "tomorrow" if offset == 1 else f"on {date.strftime('%A')}"
+
+def _windows(hours: list[dict], summary: dict, key: str) -> str:
+    """Spoken periods with key > 0, e.g. 'in the morning and in the evening'."""
+    sunrise_hour = _parse_hour(summary["sun_times"]["sunrise"][-5:])
+    sunset_hour = _parse_hour(summary["sun_times"]["sunset"][-5:])
+    periods = []
+    for entry in hours:
+        if entry[key] > 0:
+            period = PERIOD_SPEECH[_get_period(_parse_hour(entry["time"]), sunrise_hour, sunset_hour)]
+            if period not in periods:
+                periods.append(period)
+    return " and ".join(periods)
+
+def _degrees(value: float) -> str:
+    value = round(value)
+    return f"minus {-value} degree celsius" if value < 0 else f"{value} degree celsius"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+# intensity scales of the weather prompt (services/prompts_system.py)
+def _precipitation_word(mm: float) -> str:
+    if mm <= 0.3:
+        return "very light drizzle"
+    if mm <= 1.0:
+        return "light rain"
+    if mm <= 4.0:
+        return "moderate rain"
+    return "heavy rain"
+
+def _snowfall_word(cm: float) -> str:
+    if cm <= 0.5:
+        return "light snow"
+    if cm <= 2.0:
+        return "moderate snow"
+    if cm <= 5.0:
+        return "heavy snow"
+    return "very heavy snow"
+
+def _wind_word(kmh: float) -> str:
+    if kmh <= 5:
+        return "calm"
+    if kmh <= 20:
+        return "a light breeze"
+    if kmh <= 40:
+        return "moderate wind"
+    if kmh <= 60:
+        return "strong wind"
+    if kmh <= 90:
+        return "very strong wind"
+    return "storm"
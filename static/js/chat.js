@@ -71,6 +71,10 @@ submitButton.addEventListener('touchend', async e => {
 async function startRecording() {
   try {
     recordingStartTime = Date.now();
+    unlockVoice(); // still inside the gesture, the transcript is submitted later from a callback
+    // barge-in: silence the current reply here and on the server
+    stopVoice();
+    socket.emit('voice_stop');
     // Explicitly request permissions with more details
     const stream = await navigator.mediaDevices.getUserMedia({
       audio: {
@@ -134,6 +138,7 @@ async function stopRecording() {
 
       if (transcribedText) {
         input.value = transcribedText;
+        pendingRequestId = data.request_id || null;
         chatForm.dispatchEvent(new Event('submit', { bubbles: true, cancelable: true }));
       }
     } catch (err) {
@@ -142,8 +147,11 @@ async function stopRecording() {
   };
 }
 
-// Submit handler
-chatForm.addEventListener('submit', async e => {
+// Trace id of the last transcription (/upload_audio), sent along so STT and the pipeline share one trace
+let pendingRequestId = null;
+
+// Submit handler: one Socket.IO event, the server pushes the results back (services/pipeline.py)
+chatForm.addEventListener('submit', e => {
   e.preventDefault();
   const userText = input.value.trim();
   if (!userText) return;
@@ -151,67 +159,63 @@ chatForm.addEventListener('submit', async e => {
   addMessage(userText, 'user');
   input.value = '';
   input.disabled = true;
+  unlockVoice();
+  stopVoice(); // the server cancels the old synthesis when the message arrives
+  socket.emit('user_message', { message: userText, request_id: pendingRequestId });
+  pendingRequestId = null;
+});
 
-  try {
-    // Step 1: Hardcode
-    let response = await fetch('/hardcode', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message: userText })
-    });
-    let data = await response.json();
-    let reply = data.reply;
+// socket is created in attachment.js, which loads after this file
+window.addEventListener('DOMContentLoaded', () => {
+  let streamDiv = null;
 
-    // Step 2: Intent (only if not bypass)
-    if (reply !== "Hardcode detected: wikipedia" &&
-        reply !== "Hardcode detected: web search") {
-      response = await fetch('/intent', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: userText })
-      });
-      data = await response.json();
-      reply = data.reply;
-
-      if (reply.startsWith("Handled action:")) {
-        playSuccess();
-        addMessage(reply, 'assistant');
-      } else if (reply === "Unknown intent" || reply.startsWith("Invalid intent")) {
-        playFailure();
-        addMessage(reply, 'assistant');
-      } else if (reply !== "Bypass intent") {
-        addMessage(reply, 'assistant');
-      }
+  // actions handled by the intent pass
+  socket.on('pipeline_action', data => {
+    if (data.ok) {
+      playSuccess();
+    } else {
+      playFailure();
     }
+    addMessage(data.reply, 'assistant');
+  });
 
-    // Step 3: Chat
-    response = await fetch('/chat', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message: userText })
-    });
-    data = await response.json();
-    reply = data.reply;
-
-    addMessage(reply, 'assistant');
-
-    if (!reply.startsWith("Handled action:") &&
-        reply !== "Unknown intent" &&
-        !reply.startsWith("Invalid intent")) {
-      try {
-        await streamVoice(reply);
-      } catch (err) {
-        console.warn("Streaming voice synthesis failed:", err);
-      }
+  // streamed chat reply
+  socket.on('chat_token', data => {
+    if (data.think) return;
+    if (!streamDiv) streamDiv = addMessage('', 'assistant');
+    streamDiv.textContent += data.token;
+    streamDiv.parentElement.scrollTop = streamDiv.parentElement.scrollHeight;
+  });
+
+  // final reply replaces the streamed text
+  socket.on('pipeline_reply', data => {
+    voiceBlocked = false; // its speech follows
+    if (streamDiv) {
+      streamDiv.innerHTML = data.reply.replace(/\n/g, '<br>');
+    } else if (data.reply) {
+      addMessage(data.reply, 'assistant');
     }
+    streamDiv = null;
+  });
 
-  } catch (err) {
-    console.error(err);
-    addMessage('Sorry, something went wrong.', 'assistant');
-  } finally {
+  socket.on('voice_segment', queueVoiceSegment);
+
+  socket.on('voice_ready', data => {
+    playVoice(data.timestamp, data.count).catch(err => {
+      console.warn("Streaming voice synthesis failed:", err);
+    });
+  });
+
+  socket.on('pipeline_done', () => {
+    streamDiv = null;
     input.disabled = false;
     input.focus();
-  }
+  });
+
+  // don't leave the input locked if the connection drops mid message
+  socket.on('disconnect', () => {
+    input.disabled = false;
+  });
 });
 
 
@@ -223,37 +227,87 @@ function addMessage(text, role) {
   div.innerHTML = text.replace(/\n/g, '<br>');
   container.appendChild(div);
   container.scrollTop = container.scrollHeight;
+  return div;
 }
 
-// Stream voice and the wait file helper
-async function streamVoice(text) {
-  const countResponse = await fetch('/voice_chunks', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ text })
+// Streamed voice: PCM pieces (voice_segment) are scheduled back to back on one AudioContext.
+// The context has to be created/resumed from a user gesture (submit) or mobile browsers keep it muted.
+let voiceCtx = null;
+let voiceStream = null;   // timestamp of the reply being played
+let voicePlayhead = 0;    // context time the queued audio ends at
+let voiceSources = [];    // scheduled pieces, stopped on barge-in
+let voiceBlocked = false; // after stopVoice: drop late pieces of the old reply until the next reply
+let voiceGeneration = 0;  // bumped by stopVoice, ends a running playVoice loop
+let voiceAudio = null;    // file based playback (playVoice)
+
+// Stop everything that is playing or queued
+function stopVoice() {
+  voiceGeneration++;
+  voiceBlocked = true;
+  voiceSources.forEach(source => {
+    try { source.stop(); } catch {}
   });
-  const { timestamp, count } = await countResponse.json();
+  voiceSources = [];
+  voicePlayhead = 0;
+  if (voiceAudio) {
+    voiceAudio.pause();
+    voiceAudio = null;
+  }
+}
 
-  await fetch('/voice_out', {
-    method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ text, timestamp })
-  });
+function unlockVoice() {
+  if (!voiceCtx) voiceCtx = new (window.AudioContext || window.webkitAudioContext)();
+  if (voiceCtx.state === 'suspended') voiceCtx.resume();
+}
+
+function queueVoiceSegment(data) {
+  if (voiceBlocked) return;
+  unlockVoice();
+  if (voiceStream !== data.timestamp) {
+    voiceStream = data.timestamp;
+    voicePlayhead = 0;
+  }
+  const pcm = new Int16Array(data.pcm);
+  if (!pcm.length) return;
+  const buffer = voiceCtx.createBuffer(1, pcm.length, data.sample_rate);
+  const channel = buffer.getChannelData(0);
+  for (let i = 0; i < pcm.length; i++) channel[i] = pcm[i] / 32768;
+
+  const source = voiceCtx.createBufferSource();
+  source.buffer = buffer;
+  source.connect(voiceCtx.destination);
+  // small lead on the first piece, then gapless
+  const startAt = Math.max(voiceCtx.currentTime + 0.05, voicePlayhead);
+  source.start(startAt);
+  voicePlayhead = startAt + buffer.duration;
+  voiceSources.push(source);
+  source.onended = () => {
+    voiceSources = voiceSources.filter(s => s !== source);
+  };
+}
 
+// Play the voice chunks the server is synthesizing and the wait file helper (non-streaming mode)
+async function playVoice(timestamp, count) {
+  voiceBlocked = false;
+  const generation = voiceGeneration;
   for (let i = 1; i <= count; i++) {
     const path = `/static/temp/output_${i}_${timestamp}.wav`;
     const exists = await waitForFile(path, 3000, 100);
+    if (generation !== voiceGeneration) return; // stopped (barge-in)
 
     if (exists) {
       const audio = new Audio(path);
+      voiceAudio = audio;
       await new Promise(resolve => {
         audio.onended = () => {
           audio.remove();
           resolve();
         };
+        audio.onpause = resolve;
         audio.onerror = resolve;
         audio.play();
       });
+      if (generation !== voiceGeneration) return;
     } else {
       console.warn(`Chunk ${i} not found in time`);
     }